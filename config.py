@@ -11,6 +11,7 @@ BASE_URL = os.getenv("QWEN_URL", "")
 # Model Configuration
 LLM_MODEL = "qwen-plus"
 EMBEDDING_MODEL = "text-embedding-v4"
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "8"))  # 并行 embedding 请求数，默认8
 
 # Embedding Configuration
 # Using OPENAILIKEEmbeddings with OpenAI compatible API
@@ -21,15 +22,35 @@ STIX_REFERENCE_PDF = "stix-v2.1-os.pdf"
 
 # Agent Configuration
 MAX_ITERATIONS = 50
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "32768"))  # 单次转换可用的上下文（token），文档超出（扣除提示开销）时改用ReAct分块
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "1800"))  # 文档分块大小（token数），默认1800
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "150"))  # 相邻分块的重叠（token数），默认150
 CHUNK_MAX_ITERATIONS = int(os.getenv("CHUNK_MAX_ITERATIONS", "3"))  # 每个chunk的最大迭代次数，默认3
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "8"))  # 并发处理的chunk数量上限（受LLM API限流约束），默认8
+INTERMEDIATE_SAVE_INTERVAL = float(os.getenv("INTERMEDIATE_SAVE_INTERVAL", "10"))  # 分块处理时中间结果两次保存的最小间隔（秒），每次保存需合并全部已完成chunk，默认10
+VERIFY_MIN_CHUNKS = int(os.getenv("VERIFY_MIN_CHUNKS", "2"))  # 少于该chunk数且每个chunk都提取到对象时跳过一致性验证，默认2
+CHUNK_SIGNAL_FILTER = os.getenv("CHUNK_SIGNAL_FILTER", "false").lower() == "true"  # 跳过不含任何威胁情报特征（IOC、CVE、ATT&CK编号、威胁关键词）的chunk，不调用LLM；关键词表有限，默认关闭
 TEMPERATURE = 0.1  # Lower temperature for more consistent STIX format output
 LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "120"))  # LLM API超时时间（秒），默认120秒（增加到2分钟）
 LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))  # LLM API最大重试次数，默认2次
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))  # LLM API共享连接池的最大连接数
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))  # 连接池保持的空闲keep-alive连接数
 TOOL_TIMEOUT = int(os.getenv("TOOL_TIMEOUT", "30"))  # 工具调用超时时间（秒），默认30秒
 VECTOR_SEARCH_TIMEOUT = int(os.getenv("VECTOR_SEARCH_TIMEOUT", "20"))  # 向量搜索超时时间（秒），默认20秒
 MAX_TOOL_RESULT_LENGTH = int(os.getenv("MAX_TOOL_RESULT_LENGTH", "2000"))  # 工具返回结果最大长度（字符），默认2000
 MAX_MESSAGE_HISTORY = int(os.getenv("MAX_MESSAGE_HISTORY", "10"))  # 最大消息历史数量，默认10（只保留最近的交互）
 
+# Cache Configuration
+CACHE_DIR = os.getenv("CACHE_DIR", "./cache")  # 本地缓存目录
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # 语义缓存命中的余弦相似度阈值
+SEMANTIC_CACHE_MAX_CHARS = int(os.getenv("SEMANTIC_CACHE_MAX_CHARS", "8000"))  # 超过该字符数的文本只做精确匹配（embedding API有输入长度上限）
+SEARCH_CACHE_THRESHOLD = float(os.getenv("SEARCH_CACHE_THRESHOLD", "0.90"))  # 参考文档检索缓存的相似度阈值
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))  # 参考文档检索缓存的最大条目数（LRU淘汰）
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))  # 参考文档检索缓存的有效期（秒），默认600
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "5000"))  # 按内容哈希缓存的chunk提取结果最大条目数（LRU淘汰）
+CHUNK_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("CHUNK_SEMANTIC_CACHE_THRESHOLD", "0.95"))  # 跨文档复用近似chunk提取结果的余弦相似度阈值（IOC还须完全一致），大于1时关闭
+CHUNK_SEMANTIC_CACHE_SIZE = int(os.getenv("CHUNK_SEMANTIC_CACHE_SIZE", "1000"))  # 近似chunk缓存的最大条目数（LRU淘汰）
+
 # STIX Configuration
 STIX_VERSION = "2.1"
 
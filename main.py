@@ -1,10 +1,14 @@
 """Main entry point for STIX Agent."""
 import argparse
-import json
 import sys
 import warnings
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    import json as orjson
+
 # Suppress Pydantic V1 deprecation warnings for Python 3.14+
 # This is a known issue with langchain_core < 1.3.0 and Python 3.14+
 # The warning does not affect functionality, as langchain_core handles compatibility internally
@@ -16,11 +20,13 @@ warnings.filterwarnings(
 )
 
 from stixagent.loaders import DocumentLoader
-from stixagent.agents import STIXAgent
 from stixagent.utils.stix_converter import STIXConverter
 from stixagent.utils.logger import setup_logging, get_logger
 from config import DEBUG_MODE, LOG_FILE, LOG_LEVEL
 
+# File types accepted by DocumentLoader, used to pick files in --batch mode
+SUPPORTED_EXTENSIONS = ('.pdf', '.ppt', '.pptx', '.txt', '.md', '.html', '.htm')
+
 
 def main():
     """Main function to run STIX conversion."""
@@ -30,12 +36,17 @@ def main():
     parser.add_argument(
         "input_file",
         type=str,
-        help="Input file path (PDF, PPT, TXT, HTML)"
+        help="Input file path (PDF, PPT, TXT, HTML), or a directory with --batch"
     )
     parser.add_argument(
         "-o", "--output",
         type=str,
-        help="Output file path for STIX JSON (default: stdout)"
+        help="Output file path for STIX JSON (default: stdout); output directory with --batch"
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Convert every supported file in the input directory, reusing one agent"
     )
     parser.add_argument(
         "--validate",
@@ -70,16 +81,13 @@ def main():
     if debug_mode:
         logger.debug("Debug mode enabled")
     
+    if args.batch:
+        sys.exit(run_batch(args, logger))
+    
     # Load document
     logger.info(f"Loading document: {args.input_file}")
     try:
-        documents = DocumentLoader.load_document(args.input_file)
-        logger.info(f"Loaded {len(documents)} document chunks")
-        
-        # Combine all document chunks
-        full_content = "\n\n".join([doc.page_content for doc in documents])
-        metadata = documents[0].metadata if documents else {}
-        
+        full_content, metadata = load_content(args.input_file)
     except Exception as e:
         print(f"Error loading document: {e}", file=sys.stderr)
         sys.exit(1)
@@ -87,7 +95,9 @@ def main():
     # Initialize agent
     logger.info("Initializing STIX Agent...")
     try:
-        agent = STIXAgent()
+        # Imported here so --help and argument errors don't pay for LangChain/LanceDB
+        from stixagent.agents import get_agent
+        agent = get_agent()
         logger.info("STIX Agent initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing agent: {e}", exc_info=True)
@@ -96,11 +106,7 @@ def main():
     # Convert to STIX
     logger.info("Converting to STIX 2.1 format...")
     try:
-        # Use ReAct mode if requested or document is large
-        use_react = args.react or len(full_content) > 3000
-        if use_react:
-            logger.info("Using ReAct agent with text splitting...")
-        stix_output = agent.convert_to_stix(full_content, metadata, use_react=use_react)
+        stix_output = convert(agent, full_content, metadata, args.react)
         logger.info("STIX conversion completed")
     except Exception as e:
         print(f"Error during conversion: {e}", file=sys.stderr)
@@ -108,28 +114,11 @@ def main():
     
     # Validate if requested
     if args.validate:
-        logger.info("Validating STIX output...")
-        try:
-            stix_data = json.loads(stix_output)
-            is_valid, error = STIXConverter.validate_stix_json(stix_data)
-            if is_valid:
-                logger.info("STIX output is valid")
-                print("[OK] STIX output is valid")
-            else:
-                logger.error(f"STIX validation failed: {error}")
-                print(f"[FAIL] STIX validation failed: {error}", file=sys.stderr)
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON: {e}")
-            print(f"[FAIL] Invalid JSON: {e}", file=sys.stderr)
+        validate_output(stix_output, logger)
     
     # Output result
     if args.output:
-        output_path = Path(args.output)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(stix_output)
-        logger.info(f"STIX output saved to: {args.output}")
-        print(f"STIX output saved to: {args.output}")
+        write_output(stix_output, Path(args.output), logger)
     else:
         print("\n" + "="*80)
         print("STIX 2.1 Output:")
@@ -137,6 +126,86 @@ def main():
         print(stix_output)
 
 
+def load_content(input_file):
+    """Load a document and return its combined content and metadata."""
+    documents = DocumentLoader.load_document(str(input_file))
+    get_logger().info(f"Loaded {len(documents)} document chunks")
+    
+    # Combine all document chunks
+    full_content = "\n\n".join([doc.page_content for doc in documents])
+    metadata = documents[0].metadata if documents else {}
+    return full_content, metadata
+
+
+def convert(agent, full_content, metadata, react=False):
+    """Convert content to STIX; the agent switches to ReAct mode for large documents."""
+    return agent.convert_to_stix(full_content, metadata, use_react=react)
+
+
+def validate_output(stix_output, logger):
+    """Validate STIX output and report the result."""
+    logger.info("Validating STIX output...")
+    try:
+        stix_data = orjson.loads(stix_output)
+        is_valid, error = STIXConverter.validate_stix_json(stix_data)
+        if is_valid:
+            logger.info("STIX output is valid")
+            print("[OK] STIX output is valid")
+        else:
+            logger.error(f"STIX validation failed: {error}")
+            print(f"[FAIL] STIX validation failed: {error}", file=sys.stderr)
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Invalid JSON: {e}")
+        print(f"[FAIL] Invalid JSON: {e}", file=sys.stderr)
+
+
+def write_output(stix_output, output_path, logger):
+    """Write STIX output to a file, creating parent directories."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(stix_output)
+    logger.info(f"STIX output saved to: {output_path}")
+    print(f"STIX output saved to: {output_path}")
+
+
+def run_batch(args, logger):
+    """Convert every supported file in a directory with one shared agent.
+    
+    Returns the process exit code (1 if any file failed).
+    """
+    input_dir = Path(args.input_file)
+    if not input_dir.is_dir():
+        print(f"Error: --batch expects a directory: {input_dir}", file=sys.stderr)
+        return 1
+    output_dir = Path(args.output) if args.output else input_dir
+    files = sorted(p for p in input_dir.iterdir() if p.suffix.lower() in SUPPORTED_EXTENSIONS)
+    logger.info(f"Batch converting {len(files)} files from {input_dir}")
+    
+    try:
+        from stixagent.agents import get_agent
+        agent = get_agent()
+    except Exception as e:
+        logger.error(f"Error initializing agent: {e}", exc_info=True)
+        return 1
+    
+    failed = 0
+    for path in files:
+        logger.info(f"Converting {path.name}...")
+        try:
+            full_content, metadata = load_content(path)
+            stix_output = convert(agent, full_content, metadata, args.react)
+        except Exception as e:
+            logger.error(f"Failed to convert {path}: {e}")
+            print(f"[FAIL] {path.name}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        if args.validate:
+            validate_output(stix_output, logger)
+        write_output(stix_output, output_dir / f"{path.stem}.stix.json", logger)
+    
+    logger.info(f"Batch conversion completed: {len(files) - failed}/{len(files)} succeeded")
+    return 1 if failed else 0
+
 if __name__ == "__main__":
     main()
 
@@ -1,7 +1,14 @@
 """Agent modules for STIX conversion."""
-from .agent import STIXAgent
-from .react_agent import ReActSTIXAgent
 
-__all__ = ["STIXAgent", "ReActSTIXAgent"]
+__all__ = ["STIXAgent", "ReActSTIXAgent", "get_agent", "get_react_agent"]
 
 
+def __getattr__(name):
+    # The agents pull in LangChain, LangGraph and the vector store; import them on first use
+    if name in ("STIXAgent", "get_agent"):
+        from . import agent
+        return getattr(agent, name)
+    if name in ("ReActSTIXAgent", "get_react_agent"):
+        from . import react_agent
+        return getattr(react_agent, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,23 +1,71 @@
 """LangGraph Agent for STIX conversion."""
-from typing import TypedDict, Annotated, Sequence
+from typing import TypedDict, Annotated, Iterator, List, Optional, Sequence
 import operator
+import asyncio
+import functools
+import json
+import logging
+import os
+import uuid
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage, message_chunk_to_message
 from langgraph.graph import StateGraph, END
+from langgraph.errors import GraphRecursionError
 from langgraph.prebuilt import ToolNode
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableLambda
 
-from ..utils.vector_store import STIXVectorStore
+from ..utils.vector_store import get_vector_store
 from ..utils.stix_converter import STIXConverter
+from ..utils.json_utils import extract_json, dumps_json, orjson
+from ..utils.indicators import extract_indicators
+from ..utils.http_clients import get_http_client, get_async_http_client
+from ..utils.async_runner import run_sync
+from ..utils.tokenizer import get_token_counter
+from ..cache import SemanticCache
 from ..utils.logger import get_logger, log_agent_step, log_tool_call
 import sys
 from pathlib import Path
 # Add parent directory to path for config import
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from config import API_KEY, BASE_URL, LLM_MODEL, TEMPERATURE, MAX_ITERATIONS
+from config import API_KEY, BASE_URL, LLM_MODEL, TEMPERATURE, MAX_ITERATIONS, MAX_MESSAGE_HISTORY, MAX_TOOL_RESULT_LENGTH, CACHE_DIR, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_CHARS, LLM_CONTEXT_TOKENS
 
 logger = get_logger()
 
+# Tokens reserved for the system prompt, instructions and tool results in a single-pass conversion
+_PROMPT_OVERHEAD_TOKENS = 2048
+
+# Reference topics nearly every conversion looks up; prefetched so the tool call is a cache hit
+_PREFETCH_QUERIES = ("indicator pattern syntax", "bundle required fields", "stix id uuid format", "relationship object")
+
+def _truncate_tool_result(result: str) -> str:
+    """Cap a tool result at MAX_TOOL_RESULT_LENGTH characters."""
+    if len(result) > MAX_TOOL_RESULT_LENGTH:
+        return result[:MAX_TOOL_RESULT_LENGTH] + "... [truncated]"
+    return result
+
+
+def _trim_messages(messages: Sequence[BaseMessage], max_history: int) -> list:
+    """Keep the system/user prompts plus the most recent max_history messages.
+    
+    Leading ToolMessages of the kept window are dropped because the API
+    rejects tool results whose AIMessage (with tool_calls) was cut off.
+    """
+    head, history = list(messages[:2]), list(messages[2:])
+    if len(history) <= max_history:
+        return head + history
+    recent = history[-max_history:]
+    while recent and isinstance(recent[0], ToolMessage):
+        recent.pop(0)
+    return head + recent
+
+
+def _finish_streamed_response(response) -> AIMessage:
+    """Turn the accumulated AIMessageChunk of a stream into an AIMessage."""
+    if response is None:
+        return AIMessage(content="")
+    return message_chunk_to_message(response)
+
 
 class AgentState(TypedDict):
     """State of the agent."""
@@ -27,17 +75,6 @@ class AgentState(TypedDict):
     iteration_count: int
 
 
-# Lazy initialization of vector store
-_vector_store = None
-
-def get_vector_store():
-    """Get or create vector store instance (lazy initialization)."""
-    global _vector_store
-    if _vector_store is None:
-        _vector_store = STIXVectorStore()
-    return _vector_store
-
-
 @tool
 def search_stix_reference(query: str) -> str:
     """Search STIX 2.1 reference documentation for format requirements.
@@ -50,10 +87,11 @@ def search_stix_reference(query: str) -> str:
     """
     log_tool_call("search_stix_reference", {"query": query})
     try:
+        # Repeated or paraphrased queries are answered from the store's query cache
         vector_store = get_vector_store()
-        result = vector_store.get_relevant_context(query, k=5)
+        result = vector_store.get_relevant_context(query, k=5, max_length=MAX_TOOL_RESULT_LENGTH)
         log_tool_call("search_stix_reference", {"query": query}, result[:200] if result else None)
-        return result
+        return _truncate_tool_result(result)
     except Exception as e:
         logger.warning(f"Vector store search failed: {e}")
         return "无法从 STIX 参考文档中检索到相关信息。请根据系统提示中的 STIX 格式要求生成输出。"
@@ -70,47 +108,122 @@ def validate_stix_output(stix_json: str) -> str:
         Validation result message.
     """
     log_tool_call("validate_stix_output", {"stix_json_length": len(stix_json)})
-    try:
-        import json
-        stix_data = json.loads(stix_json)
-        is_valid, error = STIXConverter.validate_stix_json(stix_data)
-        if is_valid:
-            result = "STIX JSON is valid."
-        else:
-            result = f"STIX JSON validation failed: {error}"
-        log_tool_call("validate_stix_output", None, result)
-        return result
-    except json.JSONDecodeError as e:
-        result = f"Invalid JSON format: {str(e)}"
-        log_tool_call("validate_stix_output", None, result)
-        return result
+    is_valid, error = STIXConverter.validate_stix_string(stix_json)
+    result = "STIX JSON is valid." if is_valid else error
+    log_tool_call("validate_stix_output", None, result)
+    return _truncate_tool_result(result)
+
+
+@tool
+def validate_stix_outputs(stix_jsons: List[str]) -> str:
+    """Validate several STIX JSON candidates in one call.
+    
+    Args:
+        stix_jsons: The STIX JSON strings to validate.
+    
+    Returns:
+        JSON list with one {"index", "valid", "error"} verdict per candidate.
+    """
+    log_tool_call("validate_stix_outputs", {"candidates": len(stix_jsons)})
+    verdicts = []
+    for i, stix_json in enumerate(stix_jsons):
+        is_valid, error = STIXConverter.validate_stix_string(stix_json)
+        verdicts.append({"index": i, "valid": is_valid, "error": error})
+    result = dumps_json(verdicts)
+    log_tool_call("validate_stix_outputs", None, result[:200])
+    return _truncate_tool_result(result)
 
 
 class STIXAgent:
     """LangGraph Agent for converting penetration test cases to STIX format."""
     
+    # The system prompt is static, so build it once at class definition. Keep
+    # anything per-document out of it: providers cache an identical prompt prefix.
+    _SYSTEM_PROMPT = f"""You are an expert STIX 2.1 format converter. Your task is to convert penetration test case information into strictly compliant STIX 2.1 JSON format.
+
+{STIXConverter.get_stix_schema_hints()}
+
+Instructions:
+1. Analyze the provided penetration test case document
+2. Extract relevant threat intelligence information (indicators, attack patterns, vulnerabilities, etc.)
+3. Use the search_stix_reference tool to look up STIX format requirements when needed
+4. Generate STIX 2.1 compliant JSON output
+5. Use validate_stix_output tool to verify your output before finalizing; if you have more than one candidate bundle, check them all in one validate_stix_outputs call
+6. Output ONLY valid STIX 2.1 JSON, no additional text or explanations
+
+When you need several independent pieces of STIX reference information, emit all
+search_stix_reference calls in a single response so they run in parallel. Only chain
+tool calls across turns when a later call depends on an earlier result.
+
+The output must be a valid STIX 2.1 Bundle containing one or more STIX objects.
+All timestamps must be in ISO 8601 format.
+All IDs must follow STIX UUID format: <type>--<UUID v4>
+
+For every document:
+- Use proper STIX object types (indicator, attack-pattern, malware, etc.)
+- Include all required fields (type, id, created, modified, spec_version)
+- Use valid STIX patterns for indicators
+- Create relationships between related objects
+- Validate your output before returning
+"""
+    
     def __init__(self):
         """Initialize the agent."""
         log_agent_step("Initializing STIXAgent", {"model": LLM_MODEL, "temperature": TEMPERATURE})
-        self.llm = ChatOpenAI(
+        self.tools = [search_stix_reference, validate_stix_output, validate_stix_outputs]
+        self.cache = SemanticCache(
+            embedder=get_vector_store(),
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            path=os.path.join(CACHE_DIR, "stix_cache"),
+            max_embed_chars=SEMANTIC_CACHE_MAX_CHARS,
+        )
+        self._prefetch_started = False
+        log_agent_step("STIXAgent initialized", {"tools_count": len(self.tools)})
+    
+    # The LLM client and graph are only needed by the single-pass path;
+    # documents routed to ReActSTIXAgent never build them.
+    @functools.cached_property
+    def llm(self) -> ChatOpenAI:
+        """Chat model client (created on first use)."""
+        return ChatOpenAI(
             model=LLM_MODEL,
             api_key=API_KEY,
             base_url=BASE_URL,
             temperature=TEMPERATURE,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
         )
-        self.tools = [search_stix_reference, validate_stix_output]
-        self.llm_with_tools = self.llm.bind_tools(self.tools)
-        self.tool_node = ToolNode(self.tools)
-        self.graph = self._build_graph()
-        self.app = self.graph.compile()
-        log_agent_step("STIXAgent initialized", {"tools_count": len(self.tools)})
+    
+    @functools.cached_property
+    def llm_with_tools(self):
+        """Chat model bound to the agent tools (created on first use)."""
+        return self.llm.bind_tools(self.tools, parallel_tool_calls=True)
+    
+    @functools.cached_property
+    def tool_node(self) -> ToolNode:
+        """Tool execution node (created on first use)."""
+        return ToolNode(self.tools)
+    
+    @functools.cached_property
+    def graph(self) -> StateGraph:
+        """Uncompiled workflow graph (built on first use)."""
+        return self._build_graph()
+    
+    @functools.cached_property
+    def app(self):
+        """Compiled workflow (compiled on first use)."""
+        log_agent_step("Compiling STIXAgent graph")
+        # Each iteration is an agent step plus a tools step; the limit stops the
+        # run right after the MAX_ITERATIONS-th agent step
+        return self.graph.compile().with_config(recursion_limit=2 * MAX_ITERATIONS - 1)
     
     def _build_graph(self) -> StateGraph:
         """Build the LangGraph workflow."""
         workflow = StateGraph(AgentState)
         
         # Add nodes
-        workflow.add_node("agent", self._call_agent)
+        # Sync and async implementations, so both app.invoke and app.ainvoke work
+        workflow.add_node("agent", RunnableLambda(self._call_agent, afunc=self._acall_agent))
         workflow.add_node("tools", self.tool_node)
         
         # Set entry point
@@ -133,34 +246,80 @@ class STIXAgent:
         """Call the agent with current state."""
         iteration_count = state.get("iteration_count", 0) + 1
         log_agent_step(f"Agent iteration {iteration_count}", {"iteration": iteration_count})
-        messages = state["messages"]
-        logger.debug(f"Invoking LLM with {len(messages)} messages")
-        response = self.llm_with_tools.invoke(messages)
-        logger.debug(f"LLM response received, has_tool_calls={hasattr(response, 'tool_calls') and bool(response.tool_calls)}")
+        messages = _trim_messages(state["messages"], MAX_MESSAGE_HISTORY)
+        logger.debug("Invoking LLM with %d of %d messages", len(messages), len(state["messages"]))
+        # Stream the completion so tokens reach app.stream(stream_mode="messages") consumers early
+        response = None
+        for chunk in self.llm_with_tools.stream(messages):
+            response = chunk if response is None else response + chunk
+        response = _finish_streamed_response(response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("LLM response received, has_tool_calls=%s", bool(getattr(response, "tool_calls", None)))
+        return {
+            "messages": [response],
+            "iteration_count": iteration_count
+        }
+    
+    async def _acall_agent(self, state: AgentState) -> AgentState:
+        """Async variant of _call_agent, used when the graph runs via ainvoke."""
+        iteration_count = state.get("iteration_count", 0) + 1
+        log_agent_step(f"Agent iteration {iteration_count}", {"iteration": iteration_count})
+        messages = _trim_messages(state["messages"], MAX_MESSAGE_HISTORY)
+        logger.debug("Invoking LLM with %d of %d messages", len(messages), len(state["messages"]))
+        response = None
+        async for chunk in self.llm_with_tools.astream(messages):
+            response = chunk if response is None else response + chunk
+        response = _finish_streamed_response(response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("LLM response received, has_tool_calls=%s", bool(getattr(response, "tool_calls", None)))
         return {
             "messages": [response],
             "iteration_count": iteration_count
         }
     
     def _should_continue(self, state: AgentState) -> str:
-        """Determine if the agent should continue or end."""
-        messages = state["messages"]
-        last_message = messages[-1]
-        
-        # Check iteration limit
-        iteration_count = state.get("iteration_count", 0)
-        if iteration_count >= MAX_ITERATIONS:
-            return "end"
+        """Determine if the agent should continue or end.
         
+        The iteration limit is enforced by the graph's recursion_limit.
+        """
         # If the last message has tool calls, continue
-        if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-            return "continue"
+        return "continue" if getattr(state["messages"][-1], "tool_calls", None) else "end"
+    
+    async def _arun_graph(self, initial_state: AgentState) -> AgentState:
+        """Run the workflow and return its final state.
         
-        return "end"
+        When MAX_ITERATIONS is reached the state after the last agent step is
+        returned instead of raising GraphRecursionError.
+        """
+        final_state = initial_state
+        try:
+            async for final_state in self.app.astream(initial_state, stream_mode="values"):
+                pass
+        except GraphRecursionError:
+            logger.warning(f"Agent stopped after reaching MAX_ITERATIONS ({MAX_ITERATIONS})")
+        return final_state
     
     def convert_to_stix(self, document_content: str, document_metadata: dict = None, use_react: bool = False) -> str:
         """Convert document content to STIX format.
         
+        Synchronous wrapper around aconvert_to_stix, run on the shared background event loop.
+        
+        Args:
+            document_content: The content of the penetration test case document.
+            document_metadata: Optional metadata about the document.
+            use_react: If True, use ReAct agent with text splitting for large documents.
+        
+        Returns:
+            STIX JSON string.
+        """
+        return run_sync(self.aconvert_to_stix(document_content, document_metadata, use_react))
+    
+    async def aconvert_to_stix(self, document_content: str, document_metadata: dict = None, use_react: bool = False) -> str:
+        """Convert document content to STIX format asynchronously.
+        
+        LLM calls are awaited, so several documents can be converted
+        concurrently, e.g. ``asyncio.gather(*[agent.aconvert_to_stix(d) for d in docs])``.
+        
         Args:
             document_content: The content of the penetration test case document.
             document_metadata: Optional metadata about the document.
@@ -169,52 +328,160 @@ class STIXAgent:
         Returns:
             STIX JSON string.
         """
+        if not document_content or not document_content.strip():
+            logger.info("Empty document, returning empty STIX bundle")
+            return self._empty_bundle()
+        
+        self._log_conversion_start(document_content, document_metadata, use_react)
+        react = self._should_use_react(document_content, use_react)
+        
+        # Cache lookups may call the embedding API; keep them off the event loop
+        cached_output = await asyncio.to_thread(self._cached_output, document_content, document_metadata, react)
+        if cached_output is not None:
+            log_agent_step("Returning cached STIX output")
+            return cached_output
+        
+        if react:
+            logger.info("Using ReAct agent with text splitting for large document...")
+            from .react_agent import get_react_agent
+            react_agent = get_react_agent()
+            stix_output = await react_agent.aconvert_to_stix(document_content, document_metadata)
+        else:
+            self._start_reference_loading()
+            initial_state = self._build_initial_state(document_content, document_metadata)
+            log_agent_step("Running agent workflow")
+            final_state = await self._arun_graph(initial_state)
+            stix_output = self._extract_stix_output(final_state)
+        
+        await asyncio.to_thread(self._cache_output, document_content, document_metadata, react, stix_output)
+        return stix_output
+    
+    def stream_convert_to_stix(self, document_content: str, document_metadata: dict = None) -> Iterator[str]:
+        """Convert a document with the single-pass workflow, yielding LLM text as it is generated.
+        
+        Tokens of every agent turn are yielded as they arrive (e.g. to forward over
+        SSE); the last turn is the STIX JSON. Cached documents yield the cached
+        output in one piece. Large documents are not routed to ReActSTIXAgent here.
+        
+        Args:
+            document_content: The content of the penetration test case document.
+            document_metadata: Optional metadata about the document.
+        
+        Yields:
+            Text fragments of the assistant responses.
+        """
+        if not document_content or not document_content.strip():
+            yield self._empty_bundle()
+            return
+        
+        self._log_conversion_start(document_content, document_metadata, False)
+        cached_output = self._cached_output(document_content, document_metadata, False)
+        if cached_output is not None:
+            log_agent_step("Returning cached STIX output")
+            yield cached_output
+            return
+        
+        self._start_reference_loading()
+        initial_state = self._build_initial_state(document_content, document_metadata)
+        log_agent_step("Streaming agent workflow")
+        final_state = None
+        try:
+            for mode, data in self.app.stream(initial_state, stream_mode=["messages", "values"]):
+                if mode == "values":
+                    final_state = data
+                    continue
+                chunk, metadata = data
+                if metadata.get("langgraph_node") == "agent" and isinstance(chunk.content, str) and chunk.content:
+                    yield chunk.content
+        except GraphRecursionError:
+            logger.warning(f"Agent stopped after reaching MAX_ITERATIONS ({MAX_ITERATIONS})")
+        if final_state is not None:
+            self._cache_output(document_content, document_metadata, False, self._extract_stix_output(final_state))
+    
+    def _start_reference_loading(self):
+        """Load the reference index and the common lookups in the background.
+        
+        Called when a conversion first takes the single-pass path, so cache hits,
+        empty documents and ReAct runs never start them; only search_stix_reference
+        waits for them. The load is restarted only if it failed earlier.
+        """
+        vector_store = get_vector_store()
+        vector_store.start_background_initialize()
+        if not self._prefetch_started:
+            self._prefetch_started = True
+            vector_store.start_prefetch(_PREFETCH_QUERIES, k=5, max_length=MAX_TOOL_RESULT_LENGTH)
+    
+    def _log_conversion_start(self, document_content: str, document_metadata: dict, use_react: bool):
+        """Log the start of a conversion."""
         log_agent_step("Starting STIX conversion", {
             "content_length": len(document_content),
             "use_react": use_react,
             "metadata": bool(document_metadata)
         })
+    
+    @staticmethod
+    def _empty_bundle() -> str:
+        """STIX bundle with no objects, returned for empty documents."""
+        return STIXConverter.format_stix_output({
+            "type": "bundle",
+            "id": f"bundle--{uuid.uuid4()}",
+            "objects": []
+        })
+    
+    def _should_use_react(self, document_content: str, use_react: bool) -> bool:
+        """Whether the document should be handled by ReActSTIXAgent.
         
-        # For large documents, use ReAct agent with text splitting
-        if use_react or len(document_content) > 3000:
-            logger.info("Using ReAct agent with text splitting for large document...")
-            from .react_agent import ReActSTIXAgent
-            react_agent = ReActSTIXAgent()
-            return react_agent.convert_to_stix(document_content, document_metadata)
-        # Initialize vector store if needed
-        log_agent_step("Initializing vector store")
-        try:
-            vector_store = get_vector_store()
-            vector_store.initialize()
-            log_agent_step("Vector store initialized")
-        except Exception as e:
-            logger.warning(f"Could not initialize vector store: {e}")
-            # If vector store fails to initialize, try to continue without it
-            # The agent can still work, just without STIX reference search capability
-            import logging
-            if logger.isEnabledFor(logging.DEBUG):
-                import traceback
-                traceback.print_exc()
+        Documents that fit in LLM_CONTEXT_TOKENS next to the prompt overhead are
+        converted in one pass; larger ones are split into chunks.
+        """
+        if use_react:
+            return True
+        n_tokens = get_token_counter(LLM_MODEL)(document_content)
+        logger.debug("Document size: %d tokens (single-pass budget %d)", n_tokens, LLM_CONTEXT_TOKENS - _PROMPT_OVERHEAD_TOKENS)
+        return n_tokens > LLM_CONTEXT_TOKENS - _PROMPT_OVERHEAD_TOKENS
+    
+    @staticmethod
+    def _cache_header(document_metadata: dict, react: bool) -> str:
+        """Conversion path and metadata; results are only shared when both match."""
+        metadata = json.dumps(document_metadata or {}, sort_keys=True, default=str, ensure_ascii=False)
+        return f"{'react' if react else 'graph'}:{metadata}"
+    
+    def _cached_output(self, document_content: str, document_metadata: dict, react: bool) -> Optional[str]:
+        """Cached STIX for the document, or None.
         
-        # Build system prompt
-        system_prompt = f"""You are an expert STIX 2.1 format converter. Your task is to convert penetration test case information into strictly compliant STIX 2.1 JSON format.
-
-{STIXConverter.get_stix_schema_hints()}
-
-Instructions:
-1. Analyze the provided penetration test case document
-2. Extract relevant threat intelligence information (indicators, attack patterns, vulnerabilities, etc.)
-3. Use the search_stix_reference tool to look up STIX format requirements when needed
-4. Generate STIX 2.1 compliant JSON output
-5. Use validate_stix_output tool to verify your output before finalizing
-6. Output ONLY valid STIX 2.1 JSON, no additional text or explanations
-
-The output must be a valid STIX 2.1 Bundle containing one or more STIX objects.
-All timestamps must be in ISO 8601 format.
-All IDs must follow STIX UUID format: <type>--<UUID v4>
-"""
-
-        # Build initial messages
+        A semantic hit can come from a paraphrased report, so it is only reused when
+        the conversion path, the metadata and the extracted indicators all match.
+        """
+        header = self._cache_header(document_metadata, react)
+        cached = self.cache.get(f"{header}\n{document_content}")
+        if cached is None:
+            return None
+        try:
+            entry = orjson.loads(cached)
+        except orjson.JSONDecodeError:
+            return None
+        if not isinstance(entry, dict) or entry.get("header") != header:
+            return None
+        if entry.get("indicators") != extract_indicators(document_content):
+            logger.info("Cached result names different indicators, converting again")
+            return None
+        return entry.get("output")
+    
+    def _cache_output(self, document_content: str, document_metadata: dict, react: bool, stix_output: str):
+        """Cache a conversion result if it is valid JSON (not an error message)."""
+        try:
+            orjson.loads(stix_output)
+        except orjson.JSONDecodeError:
+            return
+        header = self._cache_header(document_metadata, react)
+        self.cache.set(f"{header}\n{document_content}", dumps_json({
+            "header": header,
+            "indicators": extract_indicators(document_content),
+            "output": stix_output,
+        }))
+    
+    def _build_initial_state(self, document_content: str, document_metadata: dict = None) -> AgentState:
+        """Build the initial graph state for a document."""
         user_prompt = f"""Convert the following penetration test case into STIX 2.1 format:
 
 {document_content}
@@ -222,55 +489,44 @@ All IDs must follow STIX UUID format: <type>--<UUID v4>
 {('Document metadata: ' + str(document_metadata)) if document_metadata else ''}
 
 Please extract all relevant threat intelligence and create a STIX 2.1 Bundle with appropriate objects.
-Remember to:
-- Use proper STIX object types (indicator, attack-pattern, malware, etc.)
-- Include all required fields (type, id, created, modified, spec_version)
-- Use valid STIX patterns for indicators
-- Create relationships between related objects
-- Validate your output before returning
 """
 
         initial_state = {
             "messages": [
-                SystemMessage(content=system_prompt),
+                SystemMessage(content=self._SYSTEM_PROMPT),
                 HumanMessage(content=user_prompt)
             ],
             "input_document": document_content,
             "stix_output": "",
             "iteration_count": 0
         }
-        
-        # Run the agent
-        log_agent_step("Running agent workflow")
-        logger.debug(f"Initial state: {len(initial_state['messages'])} messages")
-        final_state = self.app.invoke(initial_state)
+        logger.debug("Initial state: %d messages", len(initial_state["messages"]))
+        return initial_state
+    
+    def _extract_stix_output(self, final_state: AgentState) -> str:
+        """Extract the STIX JSON string from the final graph state."""
         log_agent_step("Agent workflow completed", {"iterations": final_state.get("iteration_count", 0)})
         
         # Extract STIX output from the final message
         messages = final_state["messages"]
         last_message = messages[-1]
-        logger.debug(f"Final state: {len(messages)} messages, last message type: {type(last_message).__name__}")
+        logger.debug("Final state: %d messages, last message type: %s", len(messages), type(last_message).__name__)
         
         # Try to extract JSON from the response
         if isinstance(last_message, AIMessage):
             content = last_message.content
-            # Try to find JSON in the content
-            import json
-            import re
-            
             # Look for JSON object
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                try:
-                    stix_json = json_match.group(0)
-                    # Validate it's proper JSON
-                    json.loads(stix_json)
-                    return STIXConverter.format_stix_output(json.loads(stix_json))
-                except:
-                    pass
+            parsed = extract_json(content)
+            if parsed is not None:
+                return STIXConverter.format_stix_output(parsed)
             
             # If no JSON found, return the content as-is (might be in the message)
             return content
         
         return "Error: Could not extract STIX output from agent response."
 
+
+@functools.lru_cache(maxsize=1)
+def get_agent() -> STIXAgent:
+    """Return a shared STIXAgent so repeated conversions reuse one LLM client and graph."""
+    return STIXAgent()
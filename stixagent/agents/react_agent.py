@@ -1,11 +1,20 @@
 """ReAct-based Agent for STIX conversion with text splitting and consistency checking."""
-from typing import TypedDict, Annotated, Sequence, List, Dict, Any
+from typing import TYPE_CHECKING, TypedDict, Annotated, Sequence, List, Dict, Any, Optional
 import operator
+import asyncio
+import functools
+import hashlib
 import json
+import logging
+import os
+import random
+import re
 import threading
+import uuid
 import datetime
 from pathlib import Path
 import time
+from collections import Counter
 
 # #region agent log
 DEBUG_LOG_PATH = r"..\..\logs\debug-time.log"
@@ -26,22 +35,34 @@ def _debug_log(location, message, data, hypothesis_id):
     except Exception:
         pass
 # #endregion
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage, message_chunk_to_message
 from langchain_core.tools import tool
-from ..utils.vector_store import STIXVectorStore
+from ..utils.vector_store import get_vector_store
+from ..cache import ChunkCache, SemanticCache
 from ..utils.stix_converter import STIXConverter
+from ..utils.indicators import extract_indicators
+from ..utils.json_utils import JSONStreamScanner, extract_json, dumps_json, orjson
+from ..utils.tokenizer import get_token_counter
+from ..utils.http_clients import get_http_client, get_async_http_client
+from ..utils.async_runner import run_sync
 from ..loaders.text_splitter import STIXDocumentSplitter
 from ..utils.logger import get_logger, log_agent_step, log_tool_call, log_react_cycle, log_chunk_processing
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from config import API_KEY, BASE_URL, LLM_MODEL, TEMPERATURE, MAX_ITERATIONS, CHUNK_MAX_ITERATIONS, LLM_TIMEOUT, LLM_MAX_RETRIES, TOOL_TIMEOUT, MAX_TOOL_RESULT_LENGTH, MAX_MESSAGE_HISTORY
+from config import API_KEY, BASE_URL, LLM_MODEL, TEMPERATURE, MAX_ITERATIONS, CHUNK_MAX_ITERATIONS, CHUNK_CONCURRENCY, INTERMEDIATE_SAVE_INTERVAL, VERIFY_MIN_CHUNKS, CHUNK_SIGNAL_FILTER, LLM_TIMEOUT, LLM_MAX_RETRIES, TOOL_TIMEOUT, MAX_TOOL_RESULT_LENGTH, MAX_MESSAGE_HISTORY, CACHE_DIR, SEMANTIC_CACHE_MAX_CHARS, CHUNK_CACHE_SIZE, CHUNK_SEMANTIC_CACHE_THRESHOLD, CHUNK_SEMANTIC_CACHE_SIZE, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
 logger = get_logger()
 
+# 提示词要求LLM用英文关键词检索的常见对象类型；转换前一次性批量embedding，后续检索直接命中缓存
+STANDING_QUERIES = (
+    "indicator", "attack pattern", "malware", "tool", "vulnerability", "threat actor",
+    "infrastructure", "intrusion set", "campaign", "relationship", "sighting", "bundle"
+)
+
 
 class ReActState(TypedDict):
     """State for ReAct agent."""
@@ -49,7 +70,7 @@ class ReActState(TypedDict):
     original_document: str
     document_chunks: List[str]
     current_chunk_index: int
-    processed_chunks: List[Dict[str, Any]]
+    processed_chunks: Annotated[List[Dict[str, Any]], operator.add]  # Nodes return only new entries
     merged_stix: Dict[str, Any]
     iteration_count: int
     reasoning: str
@@ -57,17 +78,6 @@ class ReActState(TypedDict):
     observation: str
 
 
-# Lazy initialization of vector store
-_vector_store = None
-
-def get_vector_store():
-    """Get or create vector store instance (lazy initialization)."""
-    global _vector_store
-    if _vector_store is None:
-        _vector_store = STIXVectorStore()
-    return _vector_store
-
-
 @tool
 def search_stix_reference(query: str) -> str:
     """Search STIX 2.1 reference documentation for format requirements.
@@ -132,19 +142,10 @@ def validate_stix_output(stix_json: str) -> str:
         Validation result message.
     """
     log_tool_call("validate_stix_output", {"stix_json_length": len(stix_json)})
-    try:
-        stix_data = json.loads(stix_json)
-        is_valid, error = STIXConverter.validate_stix_json(stix_data)
-        if is_valid:
-            result = "STIX JSON is valid."
-        else:
-            result = f"STIX JSON validation failed: {error}"
-        log_tool_call("validate_stix_output", None, result)
-        return result
-    except json.JSONDecodeError as e:
-        result = f"Invalid JSON format: {str(e)}"
-        log_tool_call("validate_stix_output", None, result)
-        return result
+    is_valid, error = STIXConverter.validate_stix_string(stix_json)
+    result = "STIX JSON is valid." if is_valid else error
+    log_tool_call("validate_stix_output", None, result)
+    return result
 
 
 @tool
@@ -165,8 +166,143 @@ def compare_with_original(extracted_info: str, original_text: str) -> str:
 class ReActSTIXAgent:
     """ReAct-based Agent for converting large documents to STIX format."""
     
-    def __init__(self):
-        """Initialize the ReAct agent."""
+    # Cheap pre-filter: a chunk matching none of these (IOCs, CVE / ATT&CK ids, threat
+    # vocabulary) is boilerplate such as a table of contents or license text
+    _THREAT_SIGNAL_RE = re.compile(
+        r"CVE-\d{4}-\d+|\b(?:\d{1,3}\.){3}\d{1,3}\b|\b[A-Fa-f0-9]{32,64}\b|\bTA?\d{4}\b|\bAPT\s?\d+"
+        r"|(?:https?|hxxps?|ftp)://|\[\.\]|\b[\w.+-]+@[\w-]+\.[\w.]+"
+        r"|attack|threat|malware|malicious|exploit|vulnerab|phish|backdoor|trojan|ransom|botnet"
+        r"|payload|command.and.control|\bC2\b|\bactor|campaign|intrusion|compromis|adversar"
+        r"|infect|exfiltrat|spyware|rootkit|\bworm|dropper|implant|beacon|persistence|lateral"
+        r"|credential|indicator|target|espionage|breach|\bhack|\bIOCs?\b|\bsha-?256\b|\bmd5\b"
+        r"|攻击|威胁|漏洞|恶意|木马|后门|钓鱼|勒索|病毒|入侵|渗透|僵尸|挖矿|窃取|样本|载荷|失陷|远控|针对|攻陷",
+        re.IGNORECASE
+    )
+    
+    # System prompts are built once at class load; the schema hints never change
+    _GRAPH_CHUNK_SYSTEM_PROMPT = f"""{STIXConverter.get_stix_schema_hints()}
+
+重要提示：
+- **必须提取所有类型的 STIX 对象**：indicator、attack-pattern、malware、vulnerability、threat-actor、relationship
+- 不要只提取 indicator，必须全面分析文档中的所有威胁情报元素
+- 所有描述性字段（name、description、labels 等）必须使用中文
+- STIX 对象的结构和字段名保持英文（符合 STIX 标准）
+- 但字段值中的描述性内容应使用中文
+- 对于攻击技术，必须创建 attack-pattern 对象并包含 MITRE ATT&CK 引用（如果适用）
+- 对于恶意软件，必须创建 malware 对象
+- 对于漏洞，必须创建 vulnerability 对象并包含 CVE 引用（如果适用）
+- **使用 search_stix_reference 工具时，请使用英文关键词进行搜索**（如 "attack pattern"、"indicator"、"malware"），因为STIX参考文档是英文的，这样可以提高搜索准确性
+- 需要查询多个相互独立的参考信息时，在同一条回复中一次性发出所有 search_stix_reference 调用（它们会并行执行）；只有后一个调用依赖前一个结果时才分多轮调用
+"""
+    
+    _CHUNK_SYSTEM_PROMPT = f"""{STIXConverter.get_stix_schema_hints()}
+
+重要提示：
+- **必须提取所有类型的 STIX 对象**：indicator、attack-pattern、malware、tool、vulnerability、threat-actor、infrastructure、intrusion-set、campaign、relationship、sighting 等
+- 不要只提取 indicator，必须全面分析文档中的所有威胁情报元素
+- 根据 STIX 2.1 规范，共有18种 SDOs 和2种 SROs，根据文档内容选择合适类型
+- **使用 search_stix_reference 工具时，请使用英文关键词进行搜索**（如 "attack pattern"、"indicator"、"malware"），因为STIX参考文档是英文的，这样可以提高搜索准确性
+- 需要查询多个相互独立的参考信息时，在同一条回复中一次性发出所有 search_stix_reference 调用（它们会并行执行）；只有后一个调用依赖前一个结果时才分多轮调用
+- 所有描述性字段（name、description、labels 等）必须使用中文
+- STIX 对象的结构和字段名保持英文（符合 STIX 标准）
+- 但字段值中的描述性内容应使用中文
+- 对于攻击技术，必须创建 attack-pattern 对象并包含 MITRE ATT&CK 引用（如果适用）
+- 对于恶意软件，必须创建 malware 对象
+- 对于工具，必须创建 tool 对象
+- 对于漏洞，必须创建 vulnerability 对象并包含 CVE 引用（如果适用）
+- 对于基础设施，必须创建 infrastructure 对象
+- 使用 relationship 对象连接相关实体
+- 使用 sighting 对象记录威胁的观察实例
+"""
+    
+    # Per-chunk user prompts: only the chunk text between head and tail varies
+    _GRAPH_CHUNK_PROMPT_HEAD = """从以下文档块中提取 STIX 2.1 对象：
+
+"""
+    _GRAPH_CHUNK_PROMPT_TAIL = """
+
+请按步骤思考，必须提取所有类型的威胁情报：
+
+1. **指标 (Indicator)**: IP地址、域名、文件哈希、URL等可观察指标
+2. **攻击模式 (Attack-Pattern)**: 攻击技术、MITRE ATT&CK技术（如T1190、T1059等）
+3. **恶意软件 (Malware)**: 恶意软件名称、类型、功能描述
+4. **漏洞 (Vulnerability)**: CVE编号、漏洞描述、严重程度
+5. **威胁行为者 (Threat-Actor)**: 攻击者信息、组织、动机
+6. **关系 (Relationship)**: 对象之间的关联关系（uses、targets、indicates等）
+
+重要要求：
+- 不要只提取 indicator，必须识别并提取所有相关类型的对象
+- 如果文档提到攻击技术（如SQL注入、XSS、文件上传等），必须创建 attack-pattern 对象
+- 如果文档提到恶意软件或工具，必须创建 malware 对象
+- 如果文档提到漏洞或CVE，必须创建 vulnerability 对象
+- 所有描述性字段（name、description 等）必须使用中文
+- 创建对象之间的关系（relationship）以连接相关对象
+
+输出有效的 STIX 2.1 Bundle。如需要格式指导，可使用 search_stix_reference 工具。
+仅输出有效的 JSON，不要包含其他文本。"""
+    
+    _CHUNK_PROMPT_HEAD = """从以下文档块中提取 STIX 2.1 对象：
+
+"""
+    _CHUNK_PROMPT_TAIL = """
+
+请按步骤思考，必须提取所有类型的威胁情报（STIX 2.1 定义了18种 SDOs 和2种 SROs）：
+
+核心对象类型（必须提取）：
+1. **指标 (Indicator)**: IP地址、域名、文件哈希、URL等可观察指标
+2. **攻击模式 (Attack-Pattern)**: 攻击技术、MITRE ATT&CK技术（如T1190、T1059等）
+3. **恶意软件 (Malware)**: 恶意软件名称、类型、功能描述
+4. **工具 (Tool)**: 攻击者使用的合法软件工具
+5. **漏洞 (Vulnerability)**: CVE编号、漏洞描述、严重程度
+6. **威胁行为者 (Threat-Actor)**: 攻击者信息、组织、动机
+7. **基础设施 (Infrastructure)**: C2服务器、攻击基础设施
+8. **入侵集合 (Intrusion-Set)**: 由单一组织协调的对抗行为集合
+9. **活动 (Campaign)**: 针对特定目标的一系列恶意活动
+10. **关系 (Relationship)**: 对象之间的关联关系（uses、targets、indicates、based-on等）
+11. **目击 (Sighting)**: 观察到威胁情报的实例
+
+重要要求：
+- **不要只提取 indicator**，必须识别并提取所有相关类型的对象
+- 如果文档提到攻击技术（如SQL注入、XSS、文件上传等），必须创建 attack-pattern 对象
+- 如果文档提到恶意软件，必须创建 malware 对象
+- 如果文档提到工具（如nmap、metasploit等），必须创建 tool 对象
+- 如果文档提到漏洞或CVE，必须创建 vulnerability 对象
+- 如果文档提到C2服务器或攻击基础设施，必须创建 infrastructure 对象
+- 如果文档提到攻击活动或行动，考虑创建 campaign 或 intrusion-set 对象
+- 如果文档提到观察到威胁，创建 sighting 对象
+- 所有描述性字段（name、description 等）必须使用中文
+- 创建对象之间的关系（relationship）以连接相关对象
+- 使用 sighting 对象记录威胁的观察实例
+
+**工作流程**：
+1. 如果对STIX格式不确定，可以使用 search_stix_reference 工具查找格式规范（最多1-2次）
+2. **一旦你获得了足够的格式信息，或者即使格式不完全确定，也应该停止调用工具，直接输出完整的 STIX 2.1 Bundle JSON**
+3. 不要一直调用工具，**你的最终目标是输出JSON，而不是收集所有可能的格式信息**
+4. 如果你已经调用过工具，或者对基本格式有了解，请直接输出JSON
+
+输出要求：
+- 输出有效的 STIX 2.1 Bundle JSON
+- 格式：{"type": "bundle", "spec_version": "2.1", "objects": [...]}
+- 仅输出JSON，不要包含markdown代码块标记或其他文本
+- 即使格式不够完美，也要输出JSON，而不是继续调用工具"""
+    
+    # Part of the chunk cache key: editing any of the chunk prompts invalidates cached chunk results
+    _CHUNK_PROMPT_VERSION = hashlib.sha1(
+        (_CHUNK_SYSTEM_PROMPT + _CHUNK_PROMPT_HEAD + _CHUNK_PROMPT_TAIL).encode("utf-8")
+    ).hexdigest()[:12]
+    
+    def __init__(self, use_graph: bool = False, use_cache: bool = True):
+        """Initialize the ReAct agent.
+        
+        Args:
+            use_graph: Also build and compile the think/act/observe LangGraph workflow
+                (self.app). convert_to_stix does not use it, so it is skipped by default.
+            use_cache: Reuse the extracted STIX of byte-identical chunks from earlier
+                runs (keyed by model, prompt version and chunk text), and of
+                near-identical chunks with exactly the same indicators.
+        """
+        from langchain_openai import ChatOpenAI
+        
         log_agent_step("Initializing ReActSTIXAgent", {"model": LLM_MODEL})
         self.llm = ChatOpenAI(
             model=LLM_MODEL,
@@ -175,13 +311,36 @@ class ReActSTIXAgent:
             temperature=TEMPERATURE,
             timeout=LLM_TIMEOUT,  # 可配置的超时时间
             max_retries=LLM_MAX_RETRIES,  # 可配置的最大重试次数
+            http_client=get_http_client(),  # 共享连接池，复用 keep-alive 连接
+            http_async_client=get_async_http_client(),
         )
         self.tools = [search_stix_reference, validate_stix_output, compare_with_original]
-        self.llm_with_tools = self.llm.bind_tools(self.tools)
-        self.tool_node = ToolNode(self.tools)
-        self.splitter = STIXDocumentSplitter(chunk_size=2000, chunk_overlap=200)
-        self.graph = self._build_graph()
-        self.app = self.graph.compile()
+        self._tools_by_name = {t.name: t for t in self.tools}
+        self.llm_with_tools = self.llm.bind_tools(self.tools, parallel_tool_calls=True)
+        # Chunks are packed to a token budget so per-chunk LLM cost and latency stay even
+        self.splitter = STIXDocumentSplitter(
+            chunk_size=CHUNK_SIZE_TOKENS,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS,
+            length_function=get_token_counter(LLM_MODEL),
+        )
+        if use_graph:
+            from langgraph.prebuilt import ToolNode
+            self.tool_node = ToolNode(self.tools)
+            self.graph = self._build_graph()
+            self.app = self.graph.compile()
+        self.chunk_cache = ChunkCache(
+            path=os.path.join(CACHE_DIR, "chunk_cache.db"),
+            max_entries=CHUNK_CACHE_SIZE,
+        ) if use_cache else None
+        # Chunks that recur across documents with small edits (line breaks, page headers)
+        # are matched by embedding similarity; this index only points at rows of chunk_cache
+        self.chunk_semantic_cache = SemanticCache(
+            embedder=get_vector_store(),
+            threshold=CHUNK_SEMANTIC_CACHE_THRESHOLD,
+            path=os.path.join(CACHE_DIR, "chunk_semantic_cache"),
+            max_entries=CHUNK_SEMANTIC_CACHE_SIZE,
+            max_embed_chars=SEMANTIC_CACHE_MAX_CHARS,
+        ) if use_cache and CHUNK_SEMANTIC_CACHE_THRESHOLD <= 1 else None
         log_agent_step("ReActSTIXAgent initialized", {"tools_count": len(self.tools)})
     
     def _compress_messages(self, messages: List[BaseMessage], max_count: int) -> List[BaseMessage]:
@@ -328,77 +487,58 @@ class ReActSTIXAgent:
         
         return result
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self) -> "StateGraph":
         """Build the ReAct workflow graph."""
+        from langgraph.graph import StateGraph, END
+        
         workflow = StateGraph(ReActState)
         
         # Add nodes
-        workflow.add_node("think", self._think)
-        workflow.add_node("act", self._act)
+        workflow.add_node("think_act", self._think_act)
         workflow.add_node("observe", self._observe)
         workflow.add_node("process_chunk", self._process_chunk)
         workflow.add_node("merge_results", self._merge_results)
         workflow.add_node("verify_consistency", self._verify_consistency)
         
         # Set entry point
-        workflow.set_entry_point("think")
+        workflow.set_entry_point("think_act")
         
         # Add edges
-        workflow.add_edge("think", "act")
-        workflow.add_edge("act", "observe")
+        workflow.add_edge("think_act", "observe")
         workflow.add_conditional_edges(
             "observe",
             self._should_continue_react,
             {
-                "continue_react": "think",
+                "continue_react": "think_act",
                 "process_chunk": "process_chunk",
                 "merge": "merge_results",
                 "verify": "verify_consistency",
                 "end": END
             }
         )
-        workflow.add_edge("process_chunk", "think")
+        workflow.add_edge("process_chunk", "think_act")
         workflow.add_edge("merge_results", "verify_consistency")
         workflow.add_edge("verify_consistency", END)
         
         return workflow
     
-    def _think(self, state: ReActState) -> ReActState:
-        """ReAct: Think step - analyze current situation and plan next action."""
-        messages = state["messages"]
-        reasoning = state.get("reasoning", "")
-        
-        # Build thinking prompt
-        think_prompt = f"""Think about the current situation:
-
-Current chunk: {state.get('current_chunk_index', 0)} / {len(state.get('document_chunks', []))}
-Processed chunks: {len(state.get('processed_chunks', []))}
-Reasoning so far: {reasoning}
-
-What should I do next?
-1. If processing a chunk, analyze it and extract STIX objects
-2. If all chunks processed, merge the results
-3. If merged, verify consistency with original document
-
-Think step by step and decide the next action."""
-        
-        response = self.llm.invoke([HumanMessage(content=think_prompt)])
-        new_reasoning = reasoning + "\n" + response.content if reasoning else response.content
-        
-        return {
-            "reasoning": new_reasoning,
-            "messages": [response]
-        }
-    
-    def _act(self, state: ReActState) -> ReActState:
-        """ReAct: Act step - execute actions using tools."""
-        messages = state["messages"]
-        reasoning = state.get("reasoning", "")
+    def _think_act(self, state: ReActState) -> ReActState:
+        """ReAct: Think and act in one LLM call.
         
+        The next action follows from the chunk/merge progress in the state, so the
+        model is asked to reason briefly and then act in the same response instead
+        of spending a separate call on the reasoning.
+        """
         # Determine action based on state
         current_index = state.get("current_chunk_index", 0)
-        chunks = state.get("document_chunks", [])
-        processed = state.get("processed_chunks", [])
+        chunks = state.get("document_chunks") or ()
+        processed = state.get("processed_chunks") or ()
+        merged = state.get("merged_stix")
+        
+        situation = f"""Current chunk: {current_index} / {len(chunks)}
+Processed chunks: {len(processed)}
+
+Briefly think step by step about this situation, then carry out the action below."""
         
         if current_index < len(chunks):
             # Process current chunk
@@ -410,7 +550,7 @@ Chunk content:
 
 Extract all STIX objects from this chunk. Use search_stix_reference if needed for format guidance.
 Output valid STIX JSON for this chunk."""
-        elif len(processed) == len(chunks) and not state.get("merged_stix"):
+        elif len(processed) == len(chunks) and not merged:
             # Merge results
             action = "merge"
             action_prompt = f"""Act: Merge {len(processed)} chunk results into a single STIX Bundle.
@@ -423,16 +563,16 @@ Merge them into one cohesive STIX 2.1 Bundle."""
             action_prompt = f"""Act: Verify the merged STIX output is consistent with the original document.
 
 Original document length: {len(state.get('original_document', ''))} characters
-Merged STIX contains {len(state.get('merged_stix', {}).get('objects', []))} objects
+Merged STIX contains {len((merged or {}).get('objects', ()))} objects
 
 Check if all important information from the original document is captured in the STIX output."""
         
         response = self.llm_with_tools.invoke([
-            SystemMessage(content=f"Current reasoning: {reasoning}"),
-            HumanMessage(content=action_prompt)
+            HumanMessage(content=situation + "\n\n" + action_prompt)
         ])
         
         return {
+            "reasoning": response.content,
             "action": action,
             "messages": [response]
         }
@@ -462,8 +602,8 @@ Check if all important information from the original document is captured in the
     def _should_continue_react(self, state: ReActState) -> str:
         """Determine next step in ReAct loop."""
         current_index = state.get("current_chunk_index", 0)
-        chunks = state.get("document_chunks", [])
-        processed = state.get("processed_chunks", [])
+        chunks = state.get("document_chunks") or ()
+        processed = state.get("processed_chunks") or ()
         merged = state.get("merged_stix")
         
         # Check iteration limit
@@ -493,66 +633,31 @@ Check if all important information from the original document is captured in the
     def _process_chunk(self, state: ReActState) -> ReActState:
         """Process a single chunk and extract STIX objects."""
         current_index = state.get("current_chunk_index", 0)
-        chunks = state.get("document_chunks", [])
-        processed = state.get("processed_chunks", []).copy()
+        chunks = state.get("document_chunks") or ()
         
         if current_index >= len(chunks):
-            return state
+            return {}
         
         chunk_text = chunks[current_index]
         print(f"Processing chunk {current_index + 1}/{len(chunks)}...")
         
         # Extract STIX from chunk
-        chunk_prompt = f"""从以下文档块中提取 STIX 2.1 对象：
-
-{chunk_text}
-
-请按步骤思考，必须提取所有类型的威胁情报：
-
-1. **指标 (Indicator)**: IP地址、域名、文件哈希、URL等可观察指标
-2. **攻击模式 (Attack-Pattern)**: 攻击技术、MITRE ATT&CK技术（如T1190、T1059等）
-3. **恶意软件 (Malware)**: 恶意软件名称、类型、功能描述
-4. **漏洞 (Vulnerability)**: CVE编号、漏洞描述、严重程度
-5. **威胁行为者 (Threat-Actor)**: 攻击者信息、组织、动机
-6. **关系 (Relationship)**: 对象之间的关联关系（uses、targets、indicates等）
-
-重要要求：
-- 不要只提取 indicator，必须识别并提取所有相关类型的对象
-- 如果文档提到攻击技术（如SQL注入、XSS、文件上传等），必须创建 attack-pattern 对象
-- 如果文档提到恶意软件或工具，必须创建 malware 对象
-- 如果文档提到漏洞或CVE，必须创建 vulnerability 对象
-- 所有描述性字段（name、description 等）必须使用中文
-- 创建对象之间的关系（relationship）以连接相关对象
-
-输出有效的 STIX 2.1 Bundle。如需要格式指导，可使用 search_stix_reference 工具。
-仅输出有效的 JSON，不要包含其他文本。"""
+        chunk_prompt = self._GRAPH_CHUNK_PROMPT_HEAD + chunk_text + self._GRAPH_CHUNK_PROMPT_TAIL
         
         # Use LLM with tools to process chunk
         # Add Chinese output requirement to system message
-        system_hints = STIXConverter.get_stix_schema_hints()
-        system_message_content = f"""{system_hints}
-
-重要提示：
-- **必须提取所有类型的 STIX 对象**：indicator、attack-pattern、malware、vulnerability、threat-actor、relationship
-- 不要只提取 indicator，必须全面分析文档中的所有威胁情报元素
-- 所有描述性字段（name、description、labels 等）必须使用中文
-- STIX 对象的结构和字段名保持英文（符合 STIX 标准）
-- 但字段值中的描述性内容应使用中文
-- 对于攻击技术，必须创建 attack-pattern 对象并包含 MITRE ATT&CK 引用（如果适用）
-- 对于恶意软件，必须创建 malware 对象
-- 对于漏洞，必须创建 vulnerability 对象并包含 CVE 引用（如果适用）
-- **使用 search_stix_reference 工具时，请使用英文关键词进行搜索**（如 "attack pattern"、"indicator"、"malware"），因为STIX参考文档是英文的，这样可以提高搜索准确性
-"""
         messages = [
-            SystemMessage(content=system_message_content),
+            SystemMessage(content=self._GRAPH_CHUNK_SYSTEM_PROMPT),
             HumanMessage(content=chunk_prompt)
         ]
         
         # Run a few iterations to allow tool usage
         max_iterations = 5
+        final_ai = None
         for _ in range(max_iterations):
             response = self.llm_with_tools.invoke(messages)
             messages.append(response)
+            final_ai = response
             
             if hasattr(response, "tool_calls") and response.tool_calls:
                 # Execute tools
@@ -563,17 +668,12 @@ Check if all important information from the original document is captured in the
                 break
         
         # Extract STIX JSON from final response
-        stix_json = None
-        for msg in reversed(messages):
-            if isinstance(msg, AIMessage) and msg.content:
-                stix_json = self._extract_stix_json(msg.content)
-                if stix_json:
-                    break
+        chunk_result = self._extract_stix_data(final_ai.content) if final_ai is not None and final_ai.content else None
         
-        if stix_json:
+        new_entries = []
+        if chunk_result:
             try:
-                chunk_result = json.loads(stix_json)
-                processed.append({
+                new_entries.append({
                     "chunk_index": current_index,
                     "stix_data": chunk_result,
                     "objects": chunk_result.get("objects", [])
@@ -586,32 +686,18 @@ Check if all important information from the original document is captured in the
         
         return {
             "current_chunk_index": current_index + 1,
-            "processed_chunks": processed
+            "processed_chunks": new_entries
         }
     
     def _merge_results(self, state: ReActState) -> ReActState:
         """Merge all chunk results into a single STIX Bundle."""
-        processed = state.get("processed_chunks", [])
+        processed = state.get("processed_chunks") or ()
         
         if not processed:
-            return state
-        
-        # Collect all objects
-        all_objects = []
-        for chunk_result in processed:
-            objects = chunk_result.get("objects", [])
-            all_objects.extend(objects)
-        
-        # Create merged bundle
-        merged_bundle = {
-            "type": "bundle",
-            "id": f"bundle--merged-{len(all_objects)}-objects",
-            "spec_version": "2.1",
-            "objects": all_objects
-        }
+            return {}
         
         return {
-            "merged_stix": merged_bundle
+            "merged_stix": self._build_bundle(self._dedup_objects(processed))
         }
     
     def _verify_consistency(self, state: ReActState) -> ReActState:
@@ -641,21 +727,15 @@ If anything is missing, note it. Otherwise, confirm consistency."""
             "verification_result": response.content
         }
     
-    def _extract_stix_json(self, text: str) -> str:
-        """Extract STIX JSON from text."""
-        import re
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            try:
-                json.loads(json_match.group(0))
-                return json_match.group(0)
-            except:
-                pass
-        return ""
+    def _extract_stix_data(self, text: str) -> Optional[dict]:
+        """Parse the first balanced {...} span of text that is valid JSON (parsed once)."""
+        return extract_json(text)
     
     def convert_to_stix(self, document_content: str, document_metadata: dict = None) -> str:
         """Convert large document to STIX format using ReAct approach.
         
+        Synchronous wrapper around aconvert_to_stix, run on the shared background event loop.
+        
         Args:
             document_content: The full document content
             document_metadata: Optional metadata
@@ -663,50 +743,114 @@ If anything is missing, note it. Otherwise, confirm consistency."""
         Returns:
             STIX JSON string
         """
+        return run_sync(self.aconvert_to_stix(document_content, document_metadata))
+    
+    async def aconvert_to_stix(self, document_content: str, document_metadata: dict = None) -> str:
+        """Convert large document to STIX format, processing chunks concurrently.
+        
+        Up to CHUNK_CONCURRENCY chunks are sent to the LLM at once; results are
+        merged in document order.
+        
+        Args:
+            document_content: The full document content
+            document_metadata: Optional metadata
+            
+        Returns:
+            STIX JSON string
+        """
+        # 验证阶段只需要文档长度和开头预览，在入口处一次性计算
+        original_length = len(document_content)
+        original_preview = document_content[:2000]
+        
+        # Split in a worker thread (token counting makes it CPU-bound on large
+        # documents) while the vector store loads; chunk metadata is not needed here
+        log_agent_step("Splitting document into chunks", {"content_length": original_length})
+        split_task = asyncio.ensure_future(asyncio.to_thread(self.splitter.split_text, document_content))
+        
         # Initialize vector store
         log_agent_step("Initializing vector store")
         try:
             vs = get_vector_store()
-            vs.initialize()
+            await asyncio.wrap_future(vs.start_background_initialize())
             log_agent_step("Vector store initialized")
         except Exception as e:
             logger.warning(f"Could not initialize vector store: {e}")
         
-        # Split document into chunks
-        log_agent_step("Splitting document into chunks", {"content_length": len(document_content)})
-        chunks = self.splitter.split_document(document_content, document_metadata)
-        chunk_texts = [chunk.page_content for chunk in chunks]
+        # One batched embedding call for the queries the chunks are expected to issue
+        try:
+            await asyncio.to_thread(get_vector_store().embed_batch, list(STANDING_QUERIES))
+        except Exception as e:
+            logger.warning(f"Could not pre-embed standing queries: {e}")
+        # 后台预取这些查询的检索结果（与 search_stix_reference 相同的 k/max_length），chunk 检索时直接命中缓存
+        get_vector_store().start_prefetch(STANDING_QUERIES, k=3, max_length=MAX_TOOL_RESULT_LENGTH)
+        
+        chunk_texts = await split_task
         logger.info(f"Document split into {len(chunk_texts)} chunks")
         
-        # Process each chunk with intermediate saving
-        processed_chunks = []
+        # Process chunks concurrently with intermediate saving
+        num_chunks = len(chunk_texts)
+        chunk_results = [None] * num_chunks
+        # Identical chunks (repeated boilerplate, headers, tables) go to the LLM once;
+        # the others reuse the result of the first occurrence
+        first_index = {}
+        duplicate_of = {}
+        for i, chunk_text in enumerate(chunk_texts):
+            first = first_index.setdefault(chunk_text.strip(), i)
+            if first != i:
+                duplicate_of[i] = first
+        if duplicate_of:
+            logger.info(f"[CHUNK] {len(duplicate_of)} 个chunk与前文内容相同，复用其提取结果")
+        completed = len(duplicate_of)
         tmp_output_path = self._get_tmp_output_path()
+        semaphore = asyncio.Semaphore(max(1, CHUNK_CONCURRENCY))
+        save_lock = asyncio.Lock()
+        last_save = 0.0
         
-        for i, chunk_text in enumerate(chunk_texts):
-            log_chunk_processing(i+1, len(chunk_texts), "Starting")
-            logger.debug(f"Chunk {i+1} content length: {len(chunk_text)} characters")
-            
-            # Process chunk with ReAct approach
-            try:
-                chunk_result = self._process_chunk_simple(chunk_text, i)
-                if chunk_result:
-                    processed_chunks.append(chunk_result)
-                    objects_count = len(chunk_result.get("objects", []))
-                    log_chunk_processing(i+1, len(chunk_texts), f"Completed - {objects_count} objects extracted")
-                    
-                    # Save intermediate results after each chunk
-                    self._save_intermediate_results(processed_chunks, tmp_output_path, i+1, len(chunk_texts))
-                else:
-                    log_chunk_processing(i+1, len(chunk_texts), "Failed")
-                    # Still save intermediate results even if chunk failed
-                    if processed_chunks:
-                        self._save_intermediate_results(processed_chunks, tmp_output_path, i+1, len(chunk_texts))
-            except Exception as e:
-                logger.error(f"[CHUNK-{i+1}] 处理失败: {e}", exc_info=True)
-                log_chunk_processing(i+1, len(chunk_texts), f"Failed: {str(e)}")
-                # Save intermediate results even on error
-                if processed_chunks:
-                    self._save_intermediate_results(processed_chunks, tmp_output_path, i+1, len(chunk_texts), error=str(e))
+        async def process_bounded(i: int, chunk_text: str):
+            nonlocal completed, last_save
+            async with semaphore:
+                log_chunk_processing(i+1, num_chunks, "Starting")
+                logger.debug("Chunk %d content length: %d characters", i + 1, len(chunk_text))
+                error = None
+                try:
+                    chunk_result = await self._process_chunk_async(chunk_text, i)
+                    if chunk_result:
+                        chunk_results[i] = chunk_result
+                        objects_count = len(chunk_result.get("objects", []))
+                        log_chunk_processing(i+1, num_chunks, f"Completed - {objects_count} objects extracted")
+                    else:
+                        log_chunk_processing(i+1, num_chunks, "Failed")
+                except Exception as e:
+                    logger.error(f"[CHUNK-{i+1}] 处理失败: {e}", exc_info=True)
+                    log_chunk_processing(i+1, num_chunks, f"Failed: {str(e)}")
+                    error = str(e)
+                completed += 1
+            # Save intermediate results after a failed chunk and otherwise at most every
+            # INTERMEDIATE_SAVE_INTERVAL seconds: each save merges all results so far, so it
+            # runs off the event loop, one at a time, after the chunk has released its slot
+            if save_lock.locked() or (error is None and time.monotonic() - last_save < INTERMEDIATE_SAVE_INTERVAL):
+                return
+            processed_so_far = [r for r in chunk_results if r]
+            if processed_so_far:
+                async with save_lock:
+                    last_save = time.monotonic()
+                    await asyncio.to_thread(
+                        self._save_intermediate_results, processed_so_far, tmp_output_path, completed, num_chunks, error=error
+                    )
+        
+        # Dispatch longest chunks first: similar-length requests run side by side and the
+        # slowest calls start early instead of trailing at the end (results stay in document order)
+        dispatch_order = sorted(
+            (i for i in range(num_chunks) if i not in duplicate_of),
+            key=lambda i: len(chunk_texts[i]), reverse=True
+        )
+        await asyncio.gather(*(process_bounded(i, chunk_texts[i]) for i in dispatch_order))
+        for i, first in duplicate_of.items():
+            chunk_results[i] = chunk_results[first]
+        processed_chunks = [r for r in chunk_results if r]
+        skipped = sum(1 for r in chunk_results if r and r.get("skipped"))
+        if skipped:
+            logger.info(f"[CHUNK] {skipped}/{num_chunks} 个chunk未发现威胁情报特征，未经LLM提取（CHUNK_SIGNAL_FILTER）")
         
         # Merge all results
         log_agent_step("Merging chunk results", {"chunks_count": len(processed_chunks)})
@@ -719,25 +863,29 @@ If anything is missing, note it. Otherwise, confirm consistency."""
             
             # 统计对象类型
             if total_objects > 0:
-                obj_types = {}
-                for obj in merged_stix.get('objects', []):
-                    obj_type = obj.get("type", "unknown")
-                    obj_types[obj_type] = obj_types.get(obj_type, 0) + 1
-                type_summary = ", ".join([f"{k}: {v}" for k, v in sorted(obj_types.items())])
+                obj_types = Counter(obj.get("type", "unknown") for obj in merged_stix["objects"])
+                type_summary = ", ".join(f"{k}: {v}" for k, v in obj_types.most_common())
                 logger.info(f"[MERGE] 对象类型分布: {type_summary}")
             
             # Save final merged result to tmp file
             final_stix_output = STIXConverter.format_stix_output(merged_stix)
             self._save_final_result(final_stix_output, tmp_output_path, merged_stix)
             
-            # Verify consistency
-            log_agent_step("Verifying consistency with original document")
-            logger.info(f"[VERIFY] 开始验证合并结果与原始文档的一致性")
-            logger.info(f"[VERIFY] 原始文档长度: {len(document_content)} 字符")
-            logger.info(f"[VERIFY] 合并后对象数: {total_objects}")
-            verification = self._verify_consistency_simple(document_content, merged_stix)
-            logger.info(f"[VERIFY] 验证完成")
-            logger.info(f"[VERIFY] 验证结果 (前500字符): {verification[:500]}...")
+            # Verify consistency; a short document whose every chunk produced objects gains
+            # little from the extra LLM round-trip, so it is skipped there
+            all_chunks_extracted = all(r and (r.get("objects") or r.get("skipped")) for r in chunk_results)
+            if num_chunks < VERIFY_MIN_CHUNKS and all_chunks_extracted:
+                logger.info(f"[VERIFY] 文档仅 {num_chunks} 个chunk且均提取到对象，跳过一致性验证")
+            else:
+                log_agent_step("Verifying consistency with original document")
+                logger.info(f"[VERIFY] 开始验证合并结果与原始文档的一致性")
+                logger.info(f"[VERIFY] 原始文档长度: {original_length} 字符")
+                logger.info(f"[VERIFY] 合并后对象数: {total_objects}")
+                verification = await asyncio.to_thread(
+                    self._verify_consistency_simple, original_preview, original_length, merged_stix
+                )
+                logger.info(f"[VERIFY] 验证完成")
+                logger.info("[VERIFY] 验证结果 (前500字符): %.500s...", verification)
             
             return final_stix_output
         except Exception as e:
@@ -747,74 +895,137 @@ If anything is missing, note it. Otherwise, confirm consistency."""
                 self._save_intermediate_results(processed_chunks, tmp_output_path, len(chunk_texts), len(chunk_texts), error=f"Merge failed: {str(e)}")
             raise
     
+    async def _astream_response(self, llm, messages: List[BaseMessage], chunk_index: int) -> AIMessage:
+        """Stream a completion, stopping as soon as it contains a STIX bundle with objects.
+        
+        Trailing commentary after the JSON is never generated, which shortens the
+        call and frees the server slot early. Tool-call responses stream to the end.
+        """
+        scanner = JSONStreamScanner()
+        response = None
+        stream = llm.astream(messages)
+        try:
+            async for chunk in stream:
+                response = chunk if response is None else response + chunk
+                if response.tool_call_chunks or not isinstance(chunk.content, str):
+                    continue
+                for candidate in scanner.feed(chunk.content):
+                    try:
+                        parsed = orjson.loads(candidate)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if isinstance(parsed, dict) and parsed.get("objects"):
+                        logger.info(f"[CHUNK-{chunk_index + 1}] 流式输出中已得到完整STIX JSON，提前结束生成")
+                        return message_chunk_to_message(response)
+        finally:
+            await stream.aclose()
+        return message_chunk_to_message(response) if response is not None else AIMessage(content="")
+    
+    async def _run_tool_call(self, tool_call: dict, idx: int, total: int, chunk_index: int) -> Optional[ToolMessage]:
+        """Execute one tool call with timeout protection; None for an unknown tool."""
+        tool_name = tool_call.get("name", "")
+        tool_args = tool_call.get("args", {})
+        logger.info(f"[CHUNK-{chunk_index + 1}] 工具调用 {idx + 1}/{total}: {tool_name}")
+        logger.debug("[CHUNK-%d] 工具参数: %s", chunk_index + 1, tool_args)
+        log_tool_call(tool_name, tool_args)
+        
+        # Find and execute the tool with timeout protection
+        tool = self._tools_by_name.get(tool_name)
+        if tool is not None:
+            try:
+                # 为工具调用添加超时保护
+                try:
+                    result = await asyncio.wait_for(tool.ainvoke(tool_args), timeout=TOOL_TIMEOUT)
+                    result_str = str(result)
+                    
+                    # 压缩工具返回结果，限制长度以减少上下文大小
+                    if len(result_str) > MAX_TOOL_RESULT_LENGTH:
+                        result_str = result_str[:MAX_TOOL_RESULT_LENGTH] + f"\n...[结果被截断，原始长度: {len(str(result))} 字符]"
+                        logger.info(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 结果过长，已截断到 {MAX_TOOL_RESULT_LENGTH} 字符")
+                except asyncio.TimeoutError:
+                    logger.warning(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 超时（{TOOL_TIMEOUT}秒）")
+                    result_str = f"工具调用超时（{TOOL_TIMEOUT}秒）"
+                
+                logger.info(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 执行成功，结果长度: {len(result_str)} 字符")
+                if logger.isEnabledFor(logging.DEBUG):
+                    # Filter out non-printable characters for Windows console compatibility
+                    result_preview_safe = result_str[:200].encode('ascii', errors='ignore').decode('ascii')
+                    logger.debug("[CHUNK-%d] 工具 %s 结果预览: %s...", chunk_index + 1, tool_name, result_preview_safe)
+                log_tool_call(tool_name, tool_args, result_str[:200])
+                return ToolMessage(
+                    content=result_str,
+                    tool_call_id=tool_call.get("id", "")
+                )
+            except Exception as e:
+                logger.error(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 执行失败: {e}")
+                return ToolMessage(
+                    content=f"Error: {str(e)}",
+                    tool_call_id=tool_call.get("id", "")
+                )
+        return None
+    
     def _process_chunk_simple(self, chunk_text: str, chunk_index: int) -> dict:
+        """Process a single chunk using simplified ReAct approach (synchronous wrapper)."""
+        return run_sync(self._process_chunk_async(chunk_text, chunk_index))
+    
+    async def _process_chunk_async(self, chunk_text: str, chunk_index: int) -> dict:
+        """Process a single chunk, reusing the cached result of an identical chunk."""
+        if CHUNK_SIGNAL_FILTER and not self._THREAT_SIGNAL_RE.search(chunk_text):
+            logger.info(f"[CHUNK-{chunk_index + 1}] 未发现威胁情报特征，跳过LLM提取")
+            # Marked so the verification check treats it as intentionally empty
+            return {"objects": [], "skipped": True}
+        if self.chunk_cache is None:
+            return await self._extract_chunk_async(chunk_text, chunk_index)
+        
+        cache_key = "\n".join((LLM_MODEL, self._CHUNK_PROMPT_VERSION, chunk_text))
+        # SQLite reads block; keep them off the event loop like the writes
+        cached = await asyncio.to_thread(self.chunk_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"[CHUNK-{chunk_index + 1}] 命中chunk缓存，跳过LLM调用")
+            return orjson.loads(cached)
+        if self.chunk_semantic_cache is not None:
+            similar = await asyncio.to_thread(self._similar_chunk_result, chunk_text)
+            if similar is not None:
+                logger.info(f"[CHUNK-{chunk_index + 1}] 命中近似chunk缓存（IOC一致），跳过LLM调用")
+                return similar
+        
+        chunk_result = await self._extract_chunk_async(chunk_text, chunk_index)
+        if chunk_result and chunk_result.get("objects"):
+            await asyncio.to_thread(self.chunk_cache.set, cache_key, orjson.dumps(chunk_result))
+            if self.chunk_semantic_cache is not None:
+                # The result itself lives in chunk_cache.db; store only its row key
+                entry = {
+                    "version": f"{LLM_MODEL}/{self._CHUNK_PROMPT_VERSION}",
+                    "indicators": extract_indicators(chunk_text),
+                    "chunk_key": ChunkCache.key(cache_key).hex(),
+                }
+                await asyncio.to_thread(self.chunk_semantic_cache.set, chunk_text, dumps_json(entry))
+        return chunk_result
+    
+    def _similar_chunk_result(self, chunk_text: str) -> Optional[dict]:
+        """Result cached for a near-identical chunk with the same indicators, or None."""
+        cached = self.chunk_semantic_cache.get(chunk_text)
+        if cached is None:
+            return None
+        try:
+            entry = orjson.loads(cached)
+        except orjson.JSONDecodeError:
+            return None
+        # A similar chunk that names a different IOC would lose it, so require an exact match
+        if entry.get("version") != f"{LLM_MODEL}/{self._CHUNK_PROMPT_VERSION}":
+            return None
+        if entry.get("indicators") != extract_indicators(chunk_text) or not entry.get("chunk_key"):
+            return None
+        cached = self.chunk_cache.get_by_key(bytes.fromhex(entry["chunk_key"]))
+        return orjson.loads(cached) if cached is not None else None
+    
+    async def _extract_chunk_async(self, chunk_text: str, chunk_index: int) -> dict:
         """Process a single chunk using simplified ReAct approach."""
-        chunk_prompt = f"""从以下文档块中提取 STIX 2.1 对象：
-
-{chunk_text}
-
-请按步骤思考，必须提取所有类型的威胁情报（STIX 2.1 定义了18种 SDOs 和2种 SROs）：
-
-核心对象类型（必须提取）：
-1. **指标 (Indicator)**: IP地址、域名、文件哈希、URL等可观察指标
-2. **攻击模式 (Attack-Pattern)**: 攻击技术、MITRE ATT&CK技术（如T1190、T1059等）
-3. **恶意软件 (Malware)**: 恶意软件名称、类型、功能描述
-4. **工具 (Tool)**: 攻击者使用的合法软件工具
-5. **漏洞 (Vulnerability)**: CVE编号、漏洞描述、严重程度
-6. **威胁行为者 (Threat-Actor)**: 攻击者信息、组织、动机
-7. **基础设施 (Infrastructure)**: C2服务器、攻击基础设施
-8. **入侵集合 (Intrusion-Set)**: 由单一组织协调的对抗行为集合
-9. **活动 (Campaign)**: 针对特定目标的一系列恶意活动
-10. **关系 (Relationship)**: 对象之间的关联关系（uses、targets、indicates、based-on等）
-11. **目击 (Sighting)**: 观察到威胁情报的实例
-
-重要要求：
-- **不要只提取 indicator**，必须识别并提取所有相关类型的对象
-- 如果文档提到攻击技术（如SQL注入、XSS、文件上传等），必须创建 attack-pattern 对象
-- 如果文档提到恶意软件，必须创建 malware 对象
-- 如果文档提到工具（如nmap、metasploit等），必须创建 tool 对象
-- 如果文档提到漏洞或CVE，必须创建 vulnerability 对象
-- 如果文档提到C2服务器或攻击基础设施，必须创建 infrastructure 对象
-- 如果文档提到攻击活动或行动，考虑创建 campaign 或 intrusion-set 对象
-- 如果文档提到观察到威胁，创建 sighting 对象
-- 所有描述性字段（name、description 等）必须使用中文
-- 创建对象之间的关系（relationship）以连接相关对象
-- 使用 sighting 对象记录威胁的观察实例
-
-**工作流程**：
-1. 如果对STIX格式不确定，可以使用 search_stix_reference 工具查找格式规范（最多1-2次）
-2. **一旦你获得了足够的格式信息，或者即使格式不完全确定，也应该停止调用工具，直接输出完整的 STIX 2.1 Bundle JSON**
-3. 不要一直调用工具，**你的最终目标是输出JSON，而不是收集所有可能的格式信息**
-4. 如果你已经调用过工具，或者对基本格式有了解，请直接输出JSON
-
-输出要求：
-- 输出有效的 STIX 2.1 Bundle JSON
-- 格式：{{"type": "bundle", "spec_version": "2.1", "objects": [...]}}
-- 仅输出JSON，不要包含markdown代码块标记或其他文本
-- 即使格式不够完美，也要输出JSON，而不是继续调用工具"""
+        chunk_prompt = self._CHUNK_PROMPT_HEAD + chunk_text + self._CHUNK_PROMPT_TAIL
         
         # Add Chinese output requirement to system message
-        system_hints = STIXConverter.get_stix_schema_hints()
-        system_message_content = f"""{system_hints}
-
-重要提示：
-- **必须提取所有类型的 STIX 对象**：indicator、attack-pattern、malware、tool、vulnerability、threat-actor、infrastructure、intrusion-set、campaign、relationship、sighting 等
-- 不要只提取 indicator，必须全面分析文档中的所有威胁情报元素
-- 根据 STIX 2.1 规范，共有18种 SDOs 和2种 SROs，根据文档内容选择合适类型
-- **使用 search_stix_reference 工具时，请使用英文关键词进行搜索**（如 "attack pattern"、"indicator"、"malware"），因为STIX参考文档是英文的，这样可以提高搜索准确性
-- 所有描述性字段（name、description、labels 等）必须使用中文
-- STIX 对象的结构和字段名保持英文（符合 STIX 标准）
-- 但字段值中的描述性内容应使用中文
-- 对于攻击技术，必须创建 attack-pattern 对象并包含 MITRE ATT&CK 引用（如果适用）
-- 对于恶意软件，必须创建 malware 对象
-- 对于工具，必须创建 tool 对象
-- 对于漏洞，必须创建 vulnerability 对象并包含 CVE 引用（如果适用）
-- 对于基础设施，必须创建 infrastructure 对象
-- 使用 relationship 对象连接相关实体
-- 使用 sighting 对象记录威胁的观察实例
-"""
         messages = [
-            SystemMessage(content=system_message_content),
+            SystemMessage(content=self._CHUNK_SYSTEM_PROMPT),
             HumanMessage(content=chunk_prompt)
         ]
         
@@ -829,10 +1040,12 @@ If anything is missing, note it. Otherwise, confirm consistency."""
             "chunk_length": len(chunk_text)
         }, "D" if chunk_index == 6 else "A")
         # #endregion
+        final_ai = None  # 最近一次 LLM 响应，用于最终提取 STIX JSON
         for iteration in range(max_iterations):
             logger.info(f"[CHUNK-{chunk_index + 1}] ========== 迭代 {iteration + 1}/{max_iterations} ==========")
-            logger.debug(f"[CHUNK-{chunk_index + 1}] 调用 LLM，当前消息数: {len(messages)}")
+            logger.debug("[CHUNK-%d] 调用 LLM，当前消息数: %d", chunk_index + 1, len(messages))
             
+            llm = self.llm_with_tools
             # 如果不是第一次迭代，添加提示引导LLM输出JSON而不是继续调用工具
             if iteration > 0:  # 第二次迭代及以后
                 # 检查是否已经有工具调用和结果
@@ -857,6 +1070,8 @@ If anything is missing, note it. Otherwise, confirm consistency."""
 
 请现在输出STIX JSON，不要再调用工具。""")
                     messages.append(hint_message)
+                    # 已有工具结果：本轮使用不带工具的LLM，避免再浪费一轮工具调用
+                    llm = self.llm
             
             try:
                 # 限制消息历史长度，只保留最近的交互以减少上下文大小
@@ -865,15 +1080,16 @@ If anything is missing, note it. Otherwise, confirm consistency."""
                     messages = self._compress_messages(messages, MAX_MESSAGE_HISTORY)
                     logger.info(f"[CHUNK-{chunk_index + 1}] 消息历史过长，已压缩: {original_count} -> {len(messages)} 条消息")
                 
-                response = self.llm_with_tools.invoke(messages)
+                response = await self._astream_response(llm, messages, chunk_index)
             except Exception as e:
                 error_str = str(e).lower()
                 error_type = type(e).__name__
                 
-                # 检查是否是网络连接错误（SSL、连接超时等）
+                # 检查是否是网络连接错误（SSL、连接超时等）或限流错误（并发请求时可能触发）
                 is_network_error = any(keyword in error_str for keyword in [
                     "connection", "ssl", "timeout", "connect", "network", 
-                    "unexpected_eof", "eof occurred", "connection error"
+                    "unexpected_eof", "eof occurred", "connection error",
+                    "rate limit", "429", "too many requests"
                 ])
                 
                 if is_network_error:
@@ -884,13 +1100,14 @@ If anything is missing, note it. Otherwise, confirm consistency."""
 
                     for retry in range(retry_count):
                         try:
-                            wait_time = retry_delay * (2 ** retry)  # 指数退避：2s, 4s, 8s
+                            # 指数退避：2s, 4s, 8s，加随机抖动避免并发chunk同时重试
+                            wait_time = retry_delay * (2 ** retry) + random.uniform(0, 1)
                             logger.warning(
-                                f"[CHUNK-{chunk_index + 1}] 网络错误，{wait_time}秒后重试 {retry + 1}/{retry_count} "
+                                f"[CHUNK-{chunk_index + 1}] 网络错误，{wait_time:.1f}秒后重试 {retry + 1}/{retry_count} "
                                 f"(错误类型: {error_type})"
                             )
-                            time.sleep(wait_time)
-                            response = self.llm_with_tools.invoke(messages)
+                            await asyncio.sleep(wait_time)
+                            response = await self._astream_response(llm, messages, chunk_index)
                             retry_success = True
                             logger.info(f"[CHUNK-{chunk_index + 1}] 重试成功")
                             break  # 成功，退出重试循环
@@ -914,91 +1131,29 @@ If anything is missing, note it. Otherwise, confirm consistency."""
                 else:
                     # 其他类型的错误（如API错误、认证错误等），直接退出
                     logger.error(f"[CHUNK-{chunk_index + 1}] LLM调用失败 (错误类型: {error_type}): {e}")
-                    import traceback
-                    logger.debug(f"[CHUNK-{chunk_index + 1}] 完整错误堆栈:\n{traceback.format_exc()}")
+                    logger.debug("[CHUNK-%d] 完整错误堆栈:", chunk_index + 1, exc_info=True)
                     break
             messages.append(response)
+            final_ai = response
             
             # 记录 LLM 响应
-            response_content = response.content[:500] if hasattr(response, "content") and response.content else "无内容"
-            logger.info(f"[CHUNK-{chunk_index + 1}] LLM 响应 (前500字符): {response_content}...")
+            logger.info("[CHUNK-%d] LLM 响应 (前500字符): %.500s...", chunk_index + 1, response.content or "无内容")
             
             # 提前检查是否已经包含STIX JSON，如果是则提前退出
             if hasattr(response, "content") and response.content:
-                stix_json = self._extract_stix_json(response.content)
-                if stix_json:
-                    try:
-                        parsed_json = json.loads(stix_json)
-                        if isinstance(parsed_json, dict) and len(parsed_json.get("objects", [])) > 0:
-                            logger.info(f"[CHUNK-{chunk_index + 1}] 提前提取到STIX JSON，提前退出迭代")
-                            break
-                    except:
-                        pass
+                parsed_json = self._extract_stix_data(response.content)
+                if parsed_json and len(parsed_json.get("objects", [])) > 0:
+                    logger.info(f"[CHUNK-{chunk_index + 1}] 提前提取到STIX JSON，提前退出迭代")
+                    break
             
             if hasattr(response, "tool_calls") and response.tool_calls:
                 logger.info(f"[CHUNK-{chunk_index + 1}] 检测到工具调用: {len(response.tool_calls)} 个")
-                # Execute tools manually
-                tool_messages = []
-                for idx, tool_call in enumerate(response.tool_calls):
-                    tool_name = tool_call.get("name", "")
-                    tool_args = tool_call.get("args", {})
-                    logger.info(f"[CHUNK-{chunk_index + 1}] 工具调用 {idx + 1}/{len(response.tool_calls)}: {tool_name}")
-                    logger.debug(f"[CHUNK-{chunk_index + 1}] 工具参数: {tool_args}")
-                    log_tool_call(tool_name, tool_args)
-                    
-                    # Find and execute the tool with timeout protection
-                    for tool in self.tools:
-                        if tool.name == tool_name:
-                            try:
-                                # 为工具调用添加超时保护
-                                tool_result = [None]
-                                tool_exception = [None]
-                                
-                                def tool_target():
-                                    try:
-                                        tool_result[0] = tool.invoke(tool_args)
-                                    except Exception as e:
-                                        tool_exception[0] = e
-                                
-                                tool_thread = threading.Thread(target=tool_target)
-                                tool_thread.daemon = True
-                                tool_thread.start()
-                                tool_thread.join(timeout=TOOL_TIMEOUT)
-                                
-                                if tool_thread.is_alive():
-                                    logger.warning(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 超时（{TOOL_TIMEOUT}秒）")
-                                    result_str = f"工具调用超时（{TOOL_TIMEOUT}秒）"
-                                elif tool_exception[0]:
-                                    raise tool_exception[0]
-                                else:
-                                    result = tool_result[0]
-                                    result_str = str(result)
-                                    
-                                    # 压缩工具返回结果，限制长度以减少上下文大小
-                                    if len(result_str) > MAX_TOOL_RESULT_LENGTH:
-                                        result_str = result_str[:MAX_TOOL_RESULT_LENGTH] + f"\n...[结果被截断，原始长度: {len(str(tool_result[0]))} 字符]"
-                                        logger.info(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 结果过长，已截断到 {MAX_TOOL_RESULT_LENGTH} 字符")
-                                
-                                # Filter out non-printable characters for Windows console compatibility
-                                result_preview = result_str[:300] if len(result_str) > 300 else result_str
-                                # Replace problematic characters for logging
-                                result_preview_safe = result_preview.encode('ascii', errors='ignore').decode('ascii')
-                                logger.info(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 执行成功，结果长度: {len(result_str)} 字符")
-                                logger.debug(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 结果预览: {result_preview_safe[:200]}...")
-                                log_tool_call(tool_name, tool_args, result_str[:200])
-                                from langchain_core.messages import ToolMessage
-                                tool_messages.append(ToolMessage(
-                                    content=result_str,
-                                    tool_call_id=tool_call.get("id", "")
-                                ))
-                            except Exception as e:
-                                logger.error(f"[CHUNK-{chunk_index + 1}] 工具 {tool_name} 执行失败: {e}")
-                                from langchain_core.messages import ToolMessage
-                                tool_messages.append(ToolMessage(
-                                    content=f"Error: {str(e)}",
-                                    tool_call_id=tool_call.get("id", "")
-                                ))
-                            break
+                # Independent tool calls from one turn run concurrently; gather keeps their order
+                results = await asyncio.gather(*(
+                    self._run_tool_call(tool_call, idx, len(response.tool_calls), chunk_index)
+                    for idx, tool_call in enumerate(response.tool_calls)
+                ))
+                tool_messages = [m for m in results if m is not None]
                 
                 messages.extend(tool_messages)
                 
@@ -1019,9 +1174,10 @@ If anything is missing, note it. Otherwise, confirm consistency."""
                     messages.append(final_prompt)
                     try:
                         # 使用不带工具的LLM来强制输出JSON
-                        final_response = self.llm.invoke(messages)
+                        final_response = await self._astream_response(self.llm, messages, chunk_index)
                         messages.append(final_response)
-                        logger.info(f"[CHUNK-{chunk_index + 1}] 强制输出响应 (前500字符): {final_response.content[:500] if final_response.content else '无内容'}...")
+                        final_ai = final_response
+                        logger.info("[CHUNK-%d] 强制输出响应 (前500字符): %.500s...", chunk_index + 1, final_response.content or "无内容")
                     except Exception as e:
                         logger.error(f"[CHUNK-{chunk_index + 1}] 强制输出STIX JSON失败: {e}")
                     break
@@ -1030,54 +1186,30 @@ If anything is missing, note it. Otherwise, confirm consistency."""
             else:
                 # Got final response
                 logger.info(f"[CHUNK-{chunk_index + 1}] 处理完成，获得最终响应")
-                if hasattr(response, "content") and response.content:
-                    final_content_preview = response.content[:1000] if len(response.content) > 1000 else response.content
-                    logger.info(f"[CHUNK-{chunk_index + 1}] 最终响应内容 (前1000字符): {final_content_preview}...")
+                if response.content:
+                    logger.info("[CHUNK-%d] 最终响应内容 (前1000字符): %.1000s...", chunk_index + 1, response.content)
                 break
         
         # Extract STIX JSON
         logger.info(f"[CHUNK-{chunk_index + 1}] 开始提取 STIX JSON")
         extracted_objects = []
-        for msg in reversed(messages):
-            if isinstance(msg, AIMessage) and msg.content:
-                stix_json = self._extract_stix_json(msg.content)
-                if stix_json:
-                    try:
-                        parsed_json = json.loads(stix_json)
-                        objects_count = len(parsed_json.get("objects", [])) if isinstance(parsed_json, dict) else 0
-                        if objects_count > 0:
-                            logger.info(f"[CHUNK-{chunk_index + 1}] 成功提取 STIX JSON，包含 {objects_count} 个对象")
-                            # 统计对象类型
-                            if isinstance(parsed_json, dict) and "objects" in parsed_json:
-                                obj_types = {}
-                                for obj_idx, obj in enumerate(parsed_json["objects"]):
-                                    obj_type = obj.get("type", "unknown")
-                                    obj_types[obj_type] = obj_types.get(obj_type, 0) + 1
-                                    # #region agent log
-                                    if "created" not in obj or "modified" not in obj:
-                                        _debug_log("react_agent.py:1054", "Extracted object missing fields", {
-                                            "chunk_index": chunk_index + 1,
-                                            "object_index": obj_idx,
-                                            "type": obj_type,
-                                            "id": obj.get("id"),
-                                            "has_created": "created" in obj,
-                                            "has_modified": "modified" in obj,
-                                            "all_keys": list(obj.keys())[:10]
-                                        }, "A")
-                                    # #endregion
-                                type_summary = ", ".join([f"{k}: {v}" for k, v in obj_types.items()])
-                                logger.info(f"[CHUNK-{chunk_index + 1}] 对象类型分布: {type_summary}")
-                            # #region agent log
-                            _debug_log("react_agent.py:1071", "Chunk processing complete", {
-                                "chunk_index": chunk_index + 1,
-                                "objects_count": objects_count,
-                                "processing_time": time.time() - chunk_start_time
-                            }, "D" if chunk_index == 6 else "A")
-                            # #endregion
-                            return parsed_json
-                    except Exception as e:
-                        logger.warning(f"[CHUNK-{chunk_index + 1}] 解析 STIX JSON 失败: {e}")
-                        continue
+        parsed_json = self._extract_stix_data(final_ai.content) if final_ai is not None and final_ai.content else None
+        if parsed_json:
+            try:
+                objects_count = len(parsed_json.get("objects", [])) if isinstance(parsed_json, dict) else 0
+                if objects_count > 0:
+                    logger.info(f"[CHUNK-{chunk_index + 1}] 成功提取 STIX JSON，包含 {objects_count} 个对象")
+                    self._log_object_types(parsed_json, chunk_index)
+                    # #region agent log
+                    _debug_log("react_agent.py:1071", "Chunk processing complete", {
+                        "chunk_index": chunk_index + 1,
+                        "objects_count": objects_count,
+                        "processing_time": time.time() - chunk_start_time
+                    }, "D" if chunk_index == 6 else "A")
+                    # #endregion
+                    return parsed_json
+            except Exception as e:
+                logger.warning(f"[CHUNK-{chunk_index + 1}] 解析 STIX JSON 失败: {e}")
         
         # 如果迭代完成后仍未提取到STIX JSON，最后一次尝试强制输出
         logger.warning(f"[CHUNK-{chunk_index + 1}] 未能从消息历史中提取有效的 STIX JSON，尝试最后一次强制输出")
@@ -1105,38 +1237,18 @@ If anything is missing, note it. Otherwise, confirm consistency."""
                 final_messages = messages + [final_output_prompt]
             
             # 使用不带工具的LLM强制输出JSON
-            final_output_response = self.llm.invoke(final_messages)
-            logger.info(f"[CHUNK-{chunk_index + 1}] 最后强制输出响应 (前500字符): {final_output_response.content[:500] if final_output_response.content else '无内容'}...")
+            final_output_response = await self._astream_response(self.llm, final_messages, chunk_index)
+            logger.info("[CHUNK-%d] 最后强制输出响应 (前500字符): %.500s...", chunk_index + 1, final_output_response.content or "无内容")
             
             # 从强制输出中提取STIX JSON
             if final_output_response.content:
-                stix_json = self._extract_stix_json(final_output_response.content)
-                if stix_json:
+                parsed_json = self._extract_stix_data(final_output_response.content)
+                if parsed_json:
                     try:
-                        parsed_json = json.loads(stix_json)
                         objects_count = len(parsed_json.get("objects", [])) if isinstance(parsed_json, dict) else 0
                         if objects_count > 0:
                             logger.info(f"[CHUNK-{chunk_index + 1}] 最后一次强制输出成功，提取到 {objects_count} 个对象")
-                            # 统计对象类型
-                            if isinstance(parsed_json, dict) and "objects" in parsed_json:
-                                obj_types = {}
-                                for obj_idx, obj in enumerate(parsed_json["objects"]):
-                                    obj_type = obj.get("type", "unknown")
-                                    obj_types[obj_type] = obj_types.get(obj_type, 0) + 1
-                                    # #region agent log
-                                    if "created" not in obj or "modified" not in obj:
-                                        _debug_log("react_agent.py:1054", "Extracted object missing fields", {
-                                            "chunk_index": chunk_index + 1,
-                                            "object_index": obj_idx,
-                                            "type": obj_type,
-                                            "id": obj.get("id"),
-                                            "has_created": "created" in obj,
-                                            "has_modified": "modified" in obj,
-                                            "all_keys": list(obj.keys())[:10]
-                                        }, "A")
-                                    # #endregion
-                                type_summary = ", ".join([f"{k}: {v}" for k, v in obj_types.items()])
-                                logger.info(f"[CHUNK-{chunk_index + 1}] 对象类型分布: {type_summary}")
+                            self._log_object_types(parsed_json, chunk_index)
                             # #region agent log
                             _debug_log("react_agent.py:1134", "Chunk processing complete (forced)", {
                                 "chunk_index": chunk_index + 1,
@@ -1153,20 +1265,36 @@ If anything is missing, note it. Otherwise, confirm consistency."""
         logger.warning(f"[CHUNK-{chunk_index + 1}] 未能提取有效的 STIX JSON")
         return None
     
+    @staticmethod
+    def _log_object_types(parsed_json: dict, chunk_index: int):
+        """记录chunk提取结果的对象类型分布（按数量降序）。"""
+        objects = parsed_json.get("objects", []) if isinstance(parsed_json, dict) else []
+        obj_types = Counter(obj.get("type", "unknown") for obj in objects)
+        type_summary = ", ".join(f"{k}: {v}" for k, v in obj_types.most_common())
+        logger.info(f"[CHUNK-{chunk_index + 1}] 对象类型分布: {type_summary}")
+        # #region agent log
+        for obj_idx, obj in enumerate(objects):
+            if "created" not in obj or "modified" not in obj:
+                _debug_log("react_agent.py:1054", "Extracted object missing fields", {
+                    "chunk_index": chunk_index + 1,
+                    "object_index": obj_idx,
+                    "type": obj.get("type", "unknown"),
+                    "id": obj.get("id"),
+                    "has_created": "created" in obj,
+                    "has_modified": "modified" in obj,
+                    "all_keys": list(obj.keys())[:10]
+                }, "A")
+        # #endregion
+    
     def _get_tmp_output_path(self) -> str:
         """Get temporary output file path for intermediate results."""
-        import tempfile
-        from pathlib import Path
-        import os
-        
         # Create tmp directory if it doesn't exist
         tmp_dir = Path("./tmp")
         tmp_dir.mkdir(exist_ok=True)
         
-        # Generate unique filename with timestamp
-        import datetime
+        # Timestamp for readability, random suffix so concurrent conversions never share a file
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        return str(tmp_dir / f"output_{timestamp}.json")
+        return str(tmp_dir / f"output_{timestamp}_{uuid.uuid4().hex[:8]}.json")
     
     def _save_intermediate_results(self, processed_chunks: List[dict], output_path: str, 
                                    current_chunk: int, total_chunks: int, error: str = None):
@@ -1206,9 +1334,8 @@ If anything is missing, note it. Otherwise, confirm consistency."""
     def _save_final_result(self, stix_output: str, output_path: str, merged_stix: dict):
         """Save final result to temporary file."""
         try:
-            # Parse output to add metadata
-            import json
-            stix_data = json.loads(stix_output)
+            # merged_stix is the parsed form of stix_output; add metadata without re-parsing
+            stix_data = dict(merged_stix)
             stix_data["_metadata"] = {
                 "status": "completed",
                 "timestamp": datetime.datetime.now().isoformat(),
@@ -1220,7 +1347,7 @@ If anything is missing, note it. Otherwise, confirm consistency."""
             output_path_obj.parent.mkdir(parents=True, exist_ok=True)
             
             with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(stix_data, f, ensure_ascii=False, indent=2)
+                f.write(STIXConverter.format_stix_output(stix_data))
             
             logger.info(f"[SAVE] 最终结果已保存到临时文件: {output_path}")
         except Exception as e:
@@ -1233,36 +1360,11 @@ If anything is missing, note it. Otherwise, confirm consistency."""
             "chunks_count": len(processed_chunks)
         }, "B")
         # #endregion
-        all_objects = []
-        seen_ids = set()
-        missing_fields_count = {"created": 0, "modified": 0}
-        
-        for chunk_result in processed_chunks:
-            if isinstance(chunk_result, dict):
-                objects = chunk_result.get("objects", [])
-                # #region agent log
-                _debug_log("react_agent.py:1170", "Processing chunk objects", {
-                    "objects_count": len(objects)
-                }, "B")
-                # #endregion
-                for obj in objects:
-                    obj_id = obj.get("id")
-                    if obj_id and obj_id not in seen_ids:
-                        # #region agent log
-                        _debug_log("react_agent.py:1173", "Adding object to merge", {
-                            "type": obj.get("type"),
-                            "id": obj_id,
-                            "has_created": "created" in obj,
-                            "has_modified": "modified" in obj,
-                            "all_keys": list(obj.keys())[:10]
-                        }, "B")
-                        # #endregion
-                        if "created" not in obj:
-                            missing_fields_count["created"] += 1
-                        if "modified" not in obj:
-                            missing_fields_count["modified"] += 1
-                        all_objects.append(obj)
-                        seen_ids.add(obj_id)
+        all_objects = self._dedup_objects(processed_chunks)
+        missing_fields_count = {
+            "created": sum(1 for obj in all_objects if "created" not in obj),
+            "modified": sum(1 for obj in all_objects if "modified" not in obj)
+        }
         
         # #region agent log
         _debug_log("react_agent.py:1182", "Merge complete", {
@@ -1273,22 +1375,105 @@ If anything is missing, note it. Otherwise, confirm consistency."""
         }, "B")
         # #endregion
         
+        return self._build_bundle(all_objects)
+    
+    @staticmethod
+    def _content_key(obj: dict) -> Optional[tuple]:
+        """Identity of what an object describes, or None if it has nothing to compare.
+        
+        Overlapping chunks often yield the same indicator or attack pattern under a
+        fresh random id. Relationships and sightings are only identified by their id.
+        """
+        if obj.get("type") in ("relationship", "sighting"):
+            return None
+        name, pattern, value = obj.get("name"), obj.get("pattern"), obj.get("value")
+        if name is None and pattern is None and value is None:
+            return None
+        refs = obj.get("external_references")
+        return (obj.get("type"), name, pattern, value, dumps_json(refs) if refs else None)
+    
+    @staticmethod
+    def _dedup_objects(processed_chunks: List[dict]) -> List[dict]:
+        """Collect objects from all chunks, dropping repeated ids and repeated content.
+        
+        The first object wins. References (``*_ref`` / ``*_refs``) to a dropped
+        content duplicate are rewritten to the id of the object that was kept.
+        """
+        objects_by_id = {}
+        id_by_content = {}
+        aliases = {}  # id of a dropped content duplicate -> id of the kept object
+        for chunk_result in processed_chunks:
+            if isinstance(chunk_result, dict):
+                for obj in chunk_result.get("objects", ()):
+                    obj_id = obj.get("id")
+                    if not obj_id or obj_id in objects_by_id or obj_id in aliases:
+                        continue
+                    content_key = ReActSTIXAgent._content_key(obj)
+                    if content_key is not None:
+                        kept_id = id_by_content.setdefault(content_key, obj_id)
+                        if kept_id != obj_id:
+                            aliases[obj_id] = kept_id
+                            continue
+                    objects_by_id[obj_id] = obj
+        if not aliases:
+            return list(objects_by_id.values())
+        
+        objects = []
+        seen_relationships = set()
+        for obj in objects_by_id.values():
+            updates = {}
+            for key, value in obj.items():
+                if key.endswith("_ref") and value in aliases:
+                    updates[key] = aliases[value]
+                elif key.endswith("_refs") and isinstance(value, list) and any(ref in aliases for ref in value):
+                    updates[key] = [aliases.get(ref, ref) for ref in value]
+            # Copy rather than mutate: chunk results are also saved as intermediate output
+            if updates:
+                obj = {**obj, **updates}
+            if obj.get("type") == "relationship":
+                # Relationships between merged objects may now repeat each other
+                edge = (obj.get("relationship_type"), obj.get("source_ref"), obj.get("target_ref"))
+                if edge in seen_relationships:
+                    continue
+                seen_relationships.add(edge)
+            objects.append(obj)
+        return objects
+    
+    @staticmethod
+    def _build_bundle(objects: List[dict]) -> dict:
+        """Wrap objects in a STIX 2.1 Bundle with a fresh id."""
         return {
             "type": "bundle",
-            "id": f"bundle--merged-{len(all_objects)}-objects",
+            "id": f"bundle--{uuid.uuid4()}",
             "spec_version": "2.1",
-            "objects": all_objects
+            "objects": objects
         }
     
-    def _verify_consistency_simple(self, original: str, merged_stix: dict) -> str:
-        """Verify merged STIX is consistent with original."""
+    @staticmethod
+    def _bundle_preview(objects: List[dict], limit: int = 1000) -> str:
+        """Compact bundle JSON cut at limit characters, serializing only the objects that fit."""
+        parts = []
+        length = 0
+        for obj in objects:
+            parts.append(dumps_json(obj))
+            length += len(parts[-1]) + 1
+            if length >= limit:
+                break
+        return ('{"type":"bundle","objects":[' + ",".join(parts))[:limit]
+    
+    def _verify_consistency_simple(self, original_preview: str, original_length: int, merged_stix: dict) -> str:
+        """Verify merged STIX is consistent with the original document.
+        
+        Only the document preview and length are passed in, so the prompt
+        does not depend on the size of the full document.
+        """
         verify_prompt = f"""Verify that the merged STIX output captures all important information from the original document.
 
-Original document ({len(original)} characters):
-{original[:2000]}...
+Original document ({original_length} characters):
+{original_preview}...
 
 Merged STIX Bundle contains {len(merged_stix.get('objects', []))} objects:
-{json.dumps(merged_stix, indent=2)[:1000]}...
+{self._bundle_preview(merged_stix.get("objects", []))}...
 
 Check if all important information is captured. Respond with a brief summary."""
         
@@ -1318,3 +1503,8 @@ Check if all important information is captured. Respond with a brief summary."""
                 logger.error(f"[VERIFY] 验证失败: {e}")
                 return f"验证失败：{str(e)}"
 
+
+@functools.lru_cache(maxsize=1)
+def get_react_agent() -> ReActSTIXAgent:
+    """Return a shared ReActSTIXAgent so large documents reuse one LLM client and chunk cache."""
+    return ReActSTIXAgent()
@@ -0,0 +1,5 @@
+"""Caches for STIX conversion results."""
+from .semantic_cache import SemanticCache
+from .chunk_cache import ChunkCache
+
+__all__ = ["SemanticCache", "ChunkCache"]
@@ -0,0 +1,89 @@
+"""Persistent content-addressed cache for per-chunk extraction results."""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("stixagent")
+
+
+class ChunkCache:
+    """Cache chunk results in SQLite, keyed by the SHA-256 of the chunk key text.
+
+    Unlike SemanticCache, which rewrites its whole state every few writes, each
+    ``set`` here is a single-row upsert, so the cost of storing a result does not
+    grow with the number of cached chunks. Values are zlib-compressed bytes.
+
+    With ``max_entries`` set, the least recently used rows are deleted once the
+    cache is full. Pass ``path=None`` for an in-memory cache.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        """Initialize the cache.
+
+        Args:
+            path: SQLite database file, created if missing; None keeps it in memory.
+            max_entries: Optional capacity; least recently used entries are evicted.
+        """
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Used from the event loop and from worker threads; access is serialized by _lock
+        self._conn = sqlite3.connect(str(self.path) if self.path else ":memory:", check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (key BLOB PRIMARY KEY, value BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_accessed ON chunks (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        """Row key of text (its SHA-256 digest)."""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get(self, text: str) -> Optional[bytes]:
+        """Return the cached value for text, or None on a miss."""
+        return self.get_by_key(self.key(text))
+
+    def get_by_key(self, key: bytes) -> Optional[bytes]:
+        """Return the cached value stored under a row key from ``key()``, or None."""
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM chunks WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute("UPDATE chunks SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+            return zlib.decompress(row[0])
+        except (sqlite3.Error, zlib.error) as e:
+            logger.warning(f"Chunk cache lookup failed: {e}")
+            return None
+
+    def set(self, text: str, value: bytes):
+        """Store value for text, evicting the least recently used rows if full."""
+        row = (self.key(text), zlib.compress(value), time.time())
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO chunks (key, value, accessed) VALUES (?, ?, ?)", row)
+                if self.max_entries:
+                    (count,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+                    if count > self.max_entries:
+                        self._conn.execute(
+                            "DELETE FROM chunks WHERE key IN (SELECT key FROM chunks ORDER BY accessed LIMIT ?)",
+                            (count - self.max_entries,),
+                        )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to save chunk result to {self.path}: {e}")
+
+    def clear(self):
+        """Drop every entry, e.g. after the chunk prompts changed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
@@ -0,0 +1,341 @@
+"""Two-tier (exact + semantic) cache for STIX conversion results."""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger("stixagent")
+
+
+class SemanticCache:
+    """Cache conversion outputs by exact text hash and by embedding similarity.
+
+    Lookups first try an in-process dict keyed by the SHA-1 of the text. On a
+    miss the text is embedded and compared (inner product over L2-normalized
+    vectors, i.e. cosine similarity) against previously cached texts; a score
+    above ``threshold`` returns the stored value. FAISS ``IndexFlatIP`` is used
+    for the search when available, otherwise a numpy matrix product. Cached
+    vectors are stored as int8 codes with one float32 scale per row, a quarter
+    of the memory of float32 vectors.
+
+    Rows live in a growable buffer: an evicted entry only tombstones its row,
+    and the buffer (and FAISS index) is compacted once tombstones outnumber
+    live rows, so inserts into a full cache cost amortized O(1). With ``path``
+    set, the cache is written to ``<path>.json`` (entries) and ``<path>.npz``
+    (vectors and their keys) every ``save_every`` writes and at interpreter
+    exit; nothing is unpickled on load.
+
+    With ``max_entries`` set, the least recently used entry is evicted from
+    both tiers once the cache is full; with ``ttl`` set, entries older than
+    ``ttl`` seconds are treated as misses and dropped. Without an ``embedder``
+    only the exact tier is used, and texts longer than ``max_embed_chars``
+    skip the semantic tier (embedding APIs reject oversized inputs).
+    """
+
+    _MIN_CAPACITY = 16
+    _MIN_COMPACT = 32  # Tombstones tolerated before a compaction is considered
+
+    def __init__(self, embedder, threshold: float = 0.92, path: Optional[str] = None,
+                 max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 max_embed_chars: Optional[int] = None, save_every: int = 16):
+        """Initialize the cache.
+
+        Args:
+            embedder: Object exposing ``embed_query(text) -> List[float]``, or
+                None for an exact-match-only cache.
+            threshold: Minimum cosine similarity for a semantic hit.
+            path: Optional file path (suffix ignored) used to persist the cache across runs.
+            max_entries: Optional capacity; least recently used entries are evicted.
+            ttl: Optional lifetime of an entry in seconds.
+            max_embed_chars: Texts longer than this only use the exact tier.
+            save_every: Number of writes between two saves to ``path``.
+        """
+        self.embedder = embedder
+        self.threshold = threshold
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_embed_chars = max_embed_chars
+        self.save_every = max(1, save_every)
+        self._lock = threading.RLock()
+        self._exact = OrderedDict()  # sha1 -> value, in least-recently-used order
+        self._expires = {}  # sha1 -> expiry timestamp, only when ttl is set
+        self._rows: Dict[str, int] = {}  # sha1 -> row of its vector
+        self._row_keys: List[Optional[str]] = []  # sha1 of each row, None for a tombstone
+        self._vectors: Optional[np.ndarray] = None  # int8 codes, capacity rows
+        self._scales: Optional[np.ndarray] = None  # float32 scale of each row, 0 for a tombstone
+        self._size = 0  # Rows in use, including tombstones
+        self._stale = 0  # Tombstoned rows
+        self._index = None
+        self._last_query = None  # (key, vector) of the most recent embedding
+        self._pending = 0  # Writes since the last save
+        self._load()
+        if self.path:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _embeddable(self, text: str) -> bool:
+        return self.embedder is not None and not (self.max_embed_chars and len(text) > self.max_embed_chars)
+
+    def _embed(self, key: str, text: str, vector: Optional[List[float]] = None) -> Optional[np.ndarray]:
+        """Normalize vector, or embed text, reusing the vector from the last lookup."""
+        if vector is None:
+            if not self._embeddable(text):
+                return None
+            last_query = self._last_query  # Read once: other threads may replace it
+            if last_query and last_query[0] == key:
+                return last_query[1]
+            try:
+                vector = self.embedder.embed_query(text)
+            except Exception as e:
+                logger.warning(f"Semantic cache embedding failed, using exact match only: {e}")
+                return None
+        vector = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        self._last_query = (key, vector)
+        return vector
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray):
+        """Return int8 codes and per-row scales such that codes * scales ~= vectors."""
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype("float32")
+
+    def _rebuild_index(self):
+        if faiss is None or self._vectors is None or not self._size:
+            self._index = None
+            return
+        self._index = faiss.IndexFlatIP(self._vectors.shape[1])
+        # Tombstones have scale 0 and stay in place so index ids match rows
+        self._index.add(self._vectors[:self._size] * self._scales[:self._size, None])
+
+    def _search(self, vector: np.ndarray):
+        """Return (score, row) of the nearest live cached vector; row is None if there is none."""
+        if self._index is not None:
+            # At most _stale results can be tombstones
+            D, I = self._index.search(vector[None, :], min(self._index.ntotal, self._stale + 1))
+            for score, row in zip(D[0], I[0]):
+                if row >= 0 and self._row_keys[row] is not None:
+                    return float(score), int(row)
+            return 0.0, None
+        scores = (self._vectors[:self._size] @ vector) * self._scales[:self._size]
+        row = int(scores.argmax())
+        if self._row_keys[row] is None:
+            return 0.0, None
+        return float(scores[row]), row
+
+    def _expired(self, key: str) -> bool:
+        """Evict key and return True if its ttl has passed."""
+        if key in self._expires and self._expires[key] <= time.time():
+            self._evict(key)
+            return True
+        return False
+
+    def get(self, text: str, vector: Optional[List[float]] = None) -> Optional[str]:
+        """Return the cached value for text, or None on a miss.
+
+        ``vector`` is an embedding the caller already computed for text (or for
+        the query text stands for); it is used instead of calling the embedder.
+        """
+        key = self._key(text)
+        with self._lock:
+            self._expired(key)
+            if key in self._exact:
+                logger.info("[CACHE] Exact hit")
+                self._exact.move_to_end(key)
+                return self._exact[key]
+            if self._size == self._stale:
+                return None
+        vector = self._embed(key, text, vector)
+        if vector is None:
+            return None
+        with self._lock:
+            if self._vectors is None or self._size == self._stale or self._vectors.shape[1] != vector.shape[0]:
+                return None
+            score, row = self._search(vector)
+            if row is None or score <= self.threshold:
+                return None
+            hit_key = self._row_keys[row]
+            if self._expired(hit_key):
+                return None
+            logger.info(f"[CACHE] Semantic hit (similarity={score:.4f})")
+            self._exact.move_to_end(hit_key)
+            return self._exact[hit_key]
+
+    def set(self, text: str, value: str, vector: Optional[List[float]] = None):
+        """Store value for text in both cache tiers, see get() for ``vector``."""
+        key = self._key(text)
+        vector = self._embed(key, text, vector)
+        with self._lock:
+            self._evict(key)
+            self._exact[key] = value
+            if self.ttl:
+                self._expires[key] = time.time() + self.ttl
+            if vector is not None:
+                self._append_row(key, vector)
+            while self.max_entries and len(self._exact) > self.max_entries:
+                self._evict(next(iter(self._exact)))
+            if self._stale >= max(self._MIN_COMPACT, self._size - self._stale):
+                self._compact()
+            self._pending += 1
+            if self._pending >= self.save_every:
+                self._save()
+
+    def flush(self):
+        """Write unsaved entries to ``path`` now."""
+        with self._lock:
+            if self._pending:
+                self._save()
+
+    def clear(self):
+        """Drop every entry, e.g. after the underlying data changed."""
+        with self._lock:
+            self._exact.clear()
+            self._expires.clear()
+            self._reset_rows()
+            self._last_query = None
+            self._save()
+
+    def _reset_rows(self):
+        self._rows, self._row_keys = {}, []
+        self._vectors, self._scales = None, None
+        self._size = self._stale = 0
+        self._index = None
+
+    def _append_row(self, key: str, vector: np.ndarray):
+        """Store the vector of key in the next free row of the buffer."""
+        if self._vectors is None:
+            self._vectors = np.zeros((self._MIN_CAPACITY, vector.shape[0]), dtype=np.int8)
+            self._scales = np.zeros(self._MIN_CAPACITY, dtype="float32")
+        elif self._vectors.shape[1] != vector.shape[0]:
+            return  # Embedding model changed; keep the entry in the exact tier only
+        if self._size == len(self._vectors):
+            self._resize(2 * len(self._vectors))
+        codes, scales = self._quantize(vector[None, :])
+        row = self._size
+        self._vectors[row], self._scales[row] = codes[0], scales[0]
+        self._rows[key] = row
+        self._row_keys.append(key)
+        self._size += 1
+        if faiss is not None:
+            if self._index is None:
+                self._rebuild_index()
+            else:
+                self._index.add(codes * scales[:, None])
+
+    def _resize(self, capacity: int):
+        vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=np.int8)
+        scales = np.zeros(capacity, dtype="float32")
+        vectors[:self._size] = self._vectors[:self._size]
+        scales[:self._size] = self._scales[:self._size]
+        self._vectors, self._scales = vectors, scales
+
+    def _compact(self):
+        """Drop tombstoned rows from the buffer and rebuild the index."""
+        live = [row for row in range(self._size) if self._row_keys[row] is not None]
+        if not live:
+            self._reset_rows()
+            return
+        keys = [self._row_keys[row] for row in live]
+        vectors, scales = self._vectors[live], self._scales[live]
+        capacity = max(self._MIN_CAPACITY, 2 * len(live))
+        self._vectors = np.zeros((capacity, vectors.shape[1]), dtype=np.int8)
+        self._scales = np.zeros(capacity, dtype="float32")
+        self._vectors[:len(live)], self._scales[:len(live)] = vectors, scales
+        self._row_keys = keys
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._size, self._stale = len(live), 0
+        self._rebuild_index()
+
+    def _evict(self, key: str):
+        """Remove key from the exact tier and tombstone its row in the semantic tier."""
+        self._exact.pop(key, None)
+        self._expires.pop(key, None)
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._row_keys[row] = None
+            self._scales[row] = 0
+            self._stale += 1
+
+    def _files(self):
+        return self.path.with_suffix(".json"), self.path.with_suffix(".npz")
+
+    def _load(self):
+        if not self.path:
+            return
+        meta_path, vectors_path = self._files()
+        if not meta_path.exists():
+            return
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._exact = OrderedDict((key, value) for key, value in data.get("exact", []))
+            self._expires = {key: t for key, t in data.get("expires", {}).items() if key in self._exact}
+            if vectors_path.exists():
+                # Rows carry their own keys, so a vector file from another save cannot be misattributed
+                with np.load(vectors_path, allow_pickle=False) as arrays:
+                    row_keys = arrays["keys"].tolist()
+                    vectors, scales = arrays["vectors"], arrays["scales"]
+                if vectors.dtype == np.int8 and len(vectors) == len(scales) == len(row_keys):
+                    self._vectors, self._scales = vectors, scales.astype("float32")
+                    self._row_keys = list(row_keys)
+                    self._size = len(row_keys)
+                    for row, key in enumerate(row_keys):
+                        if key in self._exact:
+                            self._rows[key] = row
+                        else:
+                            self._row_keys[row] = None
+                            self._scales[row] = 0
+                            self._stale += 1
+                    self._compact()
+            logger.info(f"[CACHE] Loaded {len(self._exact)} cached entries from {meta_path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load semantic cache from {meta_path}: {e}")
+            self._exact, self._expires = OrderedDict(), {}
+            self._reset_rows()
+
+    def _save(self):
+        self._pending = 0
+        if not self.path:
+            return
+        meta_path, vectors_path = self._files()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            live = [row for row in range(self._size) if self._row_keys[row] is not None]
+            if live:
+                tmp_path = vectors_path.with_suffix(".npz.tmp")
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, keys=np.array([self._row_keys[row] for row in live]),
+                             vectors=self._vectors[live], scales=self._scales[live])
+                os.replace(tmp_path, vectors_path)
+            elif vectors_path.exists():
+                vectors_path.unlink()
+            tmp_path = meta_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "exact": list(self._exact.items()),
+                    "expires": self._expires,
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, meta_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Failed to save semantic cache to {meta_path}: {e}")
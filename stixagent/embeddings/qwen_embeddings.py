@@ -1,9 +1,23 @@
 """OpenAI-like Embeddings using OpenAI compatible API."""
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+import hashlib
+import random
+import sqlite3
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from langchain_core.embeddings import Embeddings
 
+# Statuses worth retrying: rate limiting and transient server errors
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
 
 class OPENAILIKEEmbeddings(Embeddings):
     """OpenAI-like embeddings using OpenAI compatible API with proper format."""
@@ -13,6 +27,10 @@ class OPENAILIKEEmbeddings(Embeddings):
         model: str = "text-embedding-v4",
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
+        max_workers: int = 8,
+        cache_path: Optional[str] = None,
+        max_retries: int = 3,
+        query_cache_size: int = 1024,
     ):
         """Initialize OpenAI-like embeddings using OpenAI compatible API.
         
@@ -20,6 +38,10 @@ class OPENAILIKEEmbeddings(Embeddings):
             model: The embedding model name
             api_key: API key for the embedding service
             base_url: Base URL for the OpenAI compatible API endpoint
+            max_workers: Maximum number of batch requests sent in parallel
+            cache_path: Optional SQLite file used to cache embeddings on disk
+            max_retries: Retries for a batch rejected with 429 or a 5xx status
+            query_cache_size: Query vectors kept in memory in front of the disk cache
         """
         if not api_key:
             raise ValueError("API key is required. Set it via api_key parameter.")
@@ -31,6 +53,68 @@ class OPENAILIKEEmbeddings(Embeddings):
         self.api_key = api_key
         self.base_url = base_url.rstrip('/')
         self.embedding_endpoint = f"{self.base_url}/embeddings"
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self.max_retries = max_retries
+        self._cache_conn = None
+        self._cache_lock = threading.Lock()
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()  # cache key -> vector, least recently used first
+        self._query_cache_lock = threading.Lock()
+        # Keep-alive connections shared by the parallel batch requests
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_workers))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+    
+    def _cache_key(self, text: str) -> str:
+        """Cache key for a text; includes the model so vectors never mix."""
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).hexdigest()
+    
+    def _get_cache(self) -> Optional[sqlite3.Connection]:
+        """Open the on-disk embedding cache (lazy initialization)."""
+        if not self.cache_path:
+            return None
+        if self._cache_conn is None:
+            Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+            self._cache_conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._cache_conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+        return self._cache_conn
+    
+    def _cache_get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the given keys."""
+        with self._cache_lock:
+            conn = self._get_cache()
+            if conn is None:
+                return {}
+            found = {}
+            unique_keys = list(set(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("d")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            return found
+    
+    def _cache_set_many(self, items: Dict[str, List[float]]):
+        """Store vectors in the on-disk cache."""
+        with self._cache_lock:
+            conn = self._get_cache()
+            if conn is None:
+                return
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("d", vector).tobytes()) for key, vector in items.items()],
+            )
+            conn.commit()
     
     def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         """Embed a batch of texts using Qwen API.
@@ -53,12 +137,20 @@ class OPENAILIKEEmbeddings(Embeddings):
         }
         
         try:
-            response = requests.post(
-                self.embedding_endpoint,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            for attempt in range(self.max_retries + 1):
+                response = self._session.post(
+                    self.embedding_endpoint,
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+                if response.status_code not in _RETRY_STATUSES or attempt == self.max_retries:
+                    break
+                # Rate limited or overloaded: back off (honoring Retry-After) with jitter,
+                # so the parallel batches do not retry in lockstep
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                time.sleep(delay + random.uniform(0, 1))
             response.raise_for_status()
             
             result = response.json()
@@ -85,6 +177,13 @@ class OPENAILIKEEmbeddings(Embeddings):
                     error_msg = f"{error_msg} - {e.response.text}"
             raise ValueError(f"Error calling embedding API: {error_msg}")
     
+    @staticmethod
+    def _iter_batches(items: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+        """Yield consecutive batches of at most batch_size items without slicing copies."""
+        it = iter(items)
+        while batch := list(islice(it, batch_size)):
+            yield batch
+    
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of documents.
         
@@ -97,16 +196,32 @@ class OPENAILIKEEmbeddings(Embeddings):
         if not texts:
             return []
         
-        # Qwen API has a batch size limit, process in batches
-        batch_size = 10
-        all_embeddings = []
+        keys = [self._cache_key(text) for text in texts]
+        try:
+            cached = self._cache_get_many(keys)
+        except sqlite3.Error:
+            cached = {}
+        missing = [i for i, key in enumerate(keys) if key not in cached]
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            embeddings = self._embed_batch(batch)
-            all_embeddings.extend(embeddings)
+        if missing:
+            # Qwen API has a batch size limit, process in batches
+            batch_size = 10
+            batches = self._iter_batches((texts[i] for i in missing), batch_size)
+            num_batches = -(-len(missing) // batch_size)
+            
+            # Batches are independent HTTP requests; overlap them, map() keeps order
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, num_batches))) as executor:
+                results = executor.map(self._embed_batch, batches)
+                vectors = [v for batch in results for v in batch]
+            
+            new_embeddings = {keys[i]: vector for i, vector in zip(missing, vectors)}
+            cached.update(new_embeddings)
+            try:
+                self._cache_set_many(new_embeddings)
+            except sqlite3.Error:
+                pass
         
-        return all_embeddings
+        return [cached[key] for key in keys]
     
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query text.
@@ -117,5 +232,18 @@ class OPENAILIKEEmbeddings(Embeddings):
         Returns:
             Embedding vector
         """
-        return self.embed_documents([text])[0]
+        # Repeated tool queries are served from memory, skipping the SQLite read
+        key = self._cache_key(text)
+        with self._query_cache_lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                return list(vector)
+        vector = self.embed_documents([text])[0]
+        if self.query_cache_size:
+            with self._query_cache_lock:
+                self._query_cache[key] = list(vector)
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return vector
 
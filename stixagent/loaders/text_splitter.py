@@ -1,5 +1,5 @@
 """Text splitter for large documents with multiple STIX objects."""
-from typing import List
+from typing import Callable, List
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
@@ -11,14 +11,17 @@ class STIXDocumentSplitter:
         self,
         chunk_size: int = 2000,
         chunk_overlap: int = 200,
-        separators: List[str] = None
+        separators: List[str] = None,
+        length_function: Callable[[str], int] = len
     ):
         """Initialize the splitter.
         
         Args:
-            chunk_size: Maximum size of each chunk
+            chunk_size: Maximum size of each chunk, in units of length_function
             chunk_overlap: Overlap between chunks
             separators: Custom separators for splitting
+            length_function: Measures text size; len (characters) by default,
+                or a token counter to pack chunks to a token budget
         """
         if separators is None:
             # Use separators that make sense for penetration test reports
@@ -36,7 +39,7 @@ class STIXDocumentSplitter:
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=separators,
-            length_function=len,
+            length_function=length_function,
         )
     
     def split_document(self, text: str, metadata: dict = None) -> List[Document]:
@@ -60,6 +63,17 @@ class STIXDocumentSplitter:
         
         return chunks
     
+    def split_text(self, text: str) -> List[str]:
+        """Split a document into chunk strings, without wrapping them in Documents.
+        
+        Args:
+            text: The full document text
+            
+        Returns:
+            List of chunk texts, in document order
+        """
+        return self.splitter.split_text(text)
+    
     def split_by_sections(self, text: str, metadata: dict = None) -> List[Document]:
         """Split document by logical sections (vulnerabilities, attacks, etc.).
         
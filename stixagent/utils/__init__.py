@@ -1,7 +1,9 @@
 """Utility modules."""
 from .logger import get_logger, setup_logging, log_agent_step, log_tool_call, log_chunk_processing
-from .vector_store import STIXVectorStore
 from .stix_converter import STIXConverter
+from .json_utils import iter_json_objects, extract_json, dumps_json
+from .indicators import extract_indicators
+from .tokenizer import get_token_counter
 
 __all__ = [
     "get_logger",
@@ -10,5 +12,19 @@ __all__ = [
     "log_tool_call",
     "log_chunk_processing",
     "STIXVectorStore",
-    "STIXConverter"
+    "get_vector_store",
+    "STIXConverter",
+    "iter_json_objects",
+    "extract_json",
+    "dumps_json",
+    "extract_indicators",
+    "get_token_counter"
 ]
+
+
+def __getattr__(name):
+    # vector_store pulls in lancedb; import it only when first used
+    if name in ("STIXVectorStore", "get_vector_store"):
+        from . import vector_store
+        return getattr(vector_store, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,34 @@
+"""Run agent coroutines from synchronous code on one shared event loop."""
+import asyncio
+import functools
+import threading
+
+
+@functools.lru_cache(maxsize=1)
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop running in a daemon thread."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="stixagent-loop", daemon=True).start()
+    return loop
+
+
+def run_sync(coro):
+    """Run coro on the shared loop and block until it returns.
+
+    Unlike asyncio.run, this keeps one loop for the whole process, so the shared
+    async httpx client keeps its keep-alive connections across calls. It also
+    works when the caller is itself inside another running event loop.
+
+    It must not be called from code running on the shared loop itself (e.g. from
+    a coroutine started by run_sync): blocking that loop on its own result would
+    deadlock, so RuntimeError is raised instead. Await the coroutine there.
+    """
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() called from the shared agent loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
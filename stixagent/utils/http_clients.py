@@ -0,0 +1,82 @@
+"""Shared HTTP clients for the OpenAI-compatible LLM API."""
+import asyncio
+import functools
+import sys
+import threading
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+try:
+    import h2  # noqa: F401  # httpx needs it for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from config import LLM_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS
+
+
+def _client_options() -> dict:
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        "timeout": httpx.Timeout(LLM_TIMEOUT, connect=5.0),
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """Process-wide sync client; every ChatOpenAI shares its keep-alive pool."""
+    return httpx.Client(**_client_options())
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """Async transport that keeps a separate connection pool for each event loop.
+
+    Pooled connections belong to the loop that opened them; reusing one from another
+    (or an already closed) loop fails with "Event loop is closed" or "attached to a
+    different loop". Pools of closed loops are dropped on the next request (the pooled
+    connections reference their loop, so a weak mapping alone would never release them).
+    """
+
+    def __init__(self, **options):
+        self._options = options
+        self._transports: Dict[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = {}
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for closed in [other for other in self._transports if other.is_closed()]:
+                del self._transports[closed]
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self._options)
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+@functools.lru_cache(maxsize=1)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Process-wide async client; every ChatOpenAI shares it.
+
+    Keep-alive connections are pooled per event loop, so aconvert_to_stix can be
+    driven from the shared runner loop, from a caller's own loop, or from repeated
+    asyncio.run calls.
+    """
+    options = _client_options()
+    transport = _PerLoopTransport(http2=options.pop("http2"), limits=options.pop("limits"))
+    return httpx.AsyncClient(transport=transport, **options)
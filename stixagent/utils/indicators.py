@@ -0,0 +1,19 @@
+"""Extraction of hard threat indicators (IOCs) from document text."""
+import re
+from typing import List
+
+# CVE ids, IPv4 addresses, hashes, ATT&CK ids, URLs, e-mail addresses and (defanged) domains
+INDICATOR_RE = re.compile(
+    r"CVE-\d{4}-\d+|\b(?:\d{1,3}\.){3}\d{1,3}\b|\b[A-Fa-f0-9]{32,64}\b|\bTA?\d{4}(?:\.\d{3})?\b"
+    r"|(?:https?|hxxps?|ftp)://\S+|\b[\w.+-]+@[\w-]+\.[\w.]+|\b(?:[a-z0-9-]+(?:\.|\[\.\]))+[a-z]{2,}\b",
+    re.IGNORECASE
+)
+
+
+def extract_indicators(text: str) -> List[str]:
+    """Return the sorted distinct indicators in text, lowercased.
+
+    Similarity-based caches compare these before reusing a result: a paraphrased
+    report that names different IOCs must not get another report's STIX back.
+    """
+    return sorted({m.lower() for m in INDICATOR_RE.findall(text)})
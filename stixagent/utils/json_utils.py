@@ -0,0 +1,88 @@
+"""Helpers for extracting JSON objects from LLM responses."""
+import re
+from typing import Any, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    import json as orjson
+
+# Characters that matter when scanning for JSON objects; everything else is skipped
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+
+
+class JSONStreamScanner:
+    """Incrementally find balanced top-level {...} spans in text fed piece by piece.
+
+    Braces inside JSON string literals (including escaped quotes) are ignored,
+    so prose and code fences around the JSON do not affect the match. Only the
+    text of the object currently being scanned is retained.
+    """
+
+    def __init__(self):
+        self._offset = 0  # Total characters fed so far
+        self._depth = 0
+        self._in_string = False
+        self._skip_until = -1  # Absolute index of the first character not escaped
+        self._parts: List[str] = []  # Pieces of the object currently open
+
+    def feed(self, text: str) -> List[str]:
+        """Scan the next piece of text and return the objects it completes."""
+        found = []
+        base = self._offset
+        self._offset += len(text)
+        segment_start = 0
+        for match in _JSON_TOKEN_RE.finditer(text):
+            i = match.start()
+            if base + i < self._skip_until:
+                continue  # Character escaped by a preceding backslash
+            c = text[i]
+            if self._in_string:
+                if c == "\\":
+                    self._skip_until = base + i + 2
+                elif c == '"':
+                    self._in_string = False
+            elif c == "{":
+                if self._depth == 0:
+                    self._parts = []
+                    segment_start = i
+                self._depth += 1
+            elif self._depth == 0:
+                continue
+            elif c == '"':
+                self._in_string = True
+            elif c == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(text[segment_start:i + 1])
+                    found.append("".join(self._parts))
+                    self._parts = []
+        if self._depth > 0:
+            self._parts.append(text[segment_start:])
+        return found
+
+
+def iter_json_objects(text: str) -> Iterator[str]:
+    """Yield each balanced top-level {...} span of text in a single pass."""
+    return iter(JSONStreamScanner().feed(text))
+
+
+def extract_json(text: str) -> Optional[dict]:
+    """Return the first top-level JSON object in text that parses, or None.
+
+    The parsed object is returned (not the substring) so callers do not parse twice.
+    """
+    for candidate in iter_json_objects(text):
+        try:
+            parsed = orjson.loads(candidate)
+        except orjson.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def dumps_json(obj: Any) -> str:
+    """Serialize obj to compact JSON text (orjson when installed, which returns bytes)."""
+    data = orjson.dumps(obj)
+    return data.decode("utf-8") if isinstance(data, bytes) else data
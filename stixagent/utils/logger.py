@@ -117,6 +117,8 @@ class STIXAgentLogger:
             details: Optional details dictionary
         """
         logger = cls.get_logger()
+        if not logger.isEnabledFor(logging.INFO):
+            return
         if details:
             # Filter out complex objects for logging
             simple_details = {k: v for k, v in details.items() if not isinstance(v, (list, dict))}
@@ -134,6 +136,8 @@ class STIXAgentLogger:
             state: Optional state information
         """
         logger = cls.get_logger()
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         if cls._debug_mode and state:
             state_str = ", ".join([f"{k}={v}" for k, v in state.items() if not isinstance(v, (list, dict))])
             logger.debug(f"[REACT-{cycle.upper()}] {state_str}")
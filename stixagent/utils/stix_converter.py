@@ -1,5 +1,10 @@
 """STIX format converter and validator."""
 import json
+import functools
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from typing import Dict, Any, Optional, Tuple
 import stix2
 from stix2 import Bundle, Indicator, Malware, ThreatActor, AttackPattern, Vulnerability, Relationship
@@ -30,18 +35,19 @@ def _debug_log(location, message, data, hypothesis_id):
 class STIXConverter:
     """Convert penetration test cases to STIX 2.1 format."""
     
+    # STIX Cyber Observable Objects (SCOs) that don't require created/modified fields
+    SCO_TYPES = frozenset({
+        'artifact', 'autonomous-system', 'directory', 'domain-name', 'email-addr',
+        'email-message', 'file', 'ipv4-addr', 'ipv6-addr', 'mac-addr', 'mutex',
+        'network-traffic', 'process', 'software', 'url', 'user-account',
+        'windows-registry-key', 'x509-certificate'
+    })
+    
     @staticmethod
     def validate_stix_json(stix_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
         """Validate STIX JSON structure."""
+        SCO_TYPES = STIXConverter.SCO_TYPES
         try:
-            # STIX Cyber Observable Objects (SCOs) that don't require created/modified fields
-            SCO_TYPES = {
-                'artifact', 'autonomous-system', 'directory', 'domain-name', 'email-addr',
-                'email-message', 'file', 'ipv4-addr', 'ipv6-addr', 'mac-addr', 'mutex',
-                'network-traffic', 'process', 'software', 'url', 'user-account',
-                'windows-registry-key', 'x509-certificate'
-            }
-
             # Try to parse as STIX bundle
             if isinstance(stix_data, dict):
                 if "type" in stix_data and stix_data["type"] == "bundle":
@@ -50,17 +56,7 @@ class STIXConverter:
                         return False, "Bundle missing 'objects' field"
 
                     # Validate each object
-                    for idx, obj in enumerate(stix_data.get("objects", [])):
-                        # #region agent log
-                        _debug_log("stix_converter.py:24", "Validating STIX object", {
-                            "index": idx,
-                            "type": obj.get("type"),
-                            "id": obj.get("id"),
-                            "has_created": "created" in obj,
-                            "has_modified": "modified" in obj,
-                            "all_keys": list(obj.keys())[:10]
-                        }, "C")
-                        # #endregion
+                    for obj in stix_data.get("objects", []):
                         if "type" not in obj:
                             return False, "STIX object missing 'type' field"
                         if "id" not in obj:
@@ -107,11 +103,39 @@ class STIXConverter:
             return False, f"Validation error: {str(e)}"
     
     @staticmethod
-    def format_stix_output(stix_data: Dict[str, Any]) -> str:
-        """Format STIX data as pretty JSON."""
-        return json.dumps(stix_data, indent=2, ensure_ascii=False)
+    @functools.lru_cache(maxsize=128)
+    def validate_stix_string(stix_json: str) -> Tuple[bool, Optional[str]]:
+        """Parse and validate a STIX JSON string; returns (is_valid, error message).
+
+        Verdicts are memoized, since agents often re-validate an unchanged bundle.
+        """
+        # Cheap shape check first: STIX output is a JSON object (bundle or single
+        # object), so prose or truncated text is rejected without a parse
+        stripped = stix_json.strip()
+        if not (stripped.startswith("{") and stripped.endswith("}")):
+            return False, "Invalid JSON format: expected a STIX Bundle or object enclosed in {...}"
+        try:
+            stix_data = orjson.loads(stix_json) if orjson is not None else json.loads(stix_json)
+        except ValueError as e:  # orjson.JSONDecodeError and json.JSONDecodeError both subclass it
+            return False, f"Invalid JSON format: {str(e)}"
+        is_valid, error = STIXConverter.validate_stix_json(stix_data)
+        return is_valid, None if is_valid else f"STIX JSON validation failed: {error}"
+    
+    @staticmethod
+    def format_stix_output(stix_data: Dict[str, Any], indent: bool = True) -> str:
+        """Format STIX data as JSON, pretty-printed unless indent is False.
+
+        Use indent=False for JSON embedded in prompts: the whitespace only adds tokens.
+        """
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(stix_data, option=option).decode("utf-8")
+        if indent:
+            return json.dumps(stix_data, indent=2, ensure_ascii=False)
+        return json.dumps(stix_data, ensure_ascii=False, separators=(",", ":"))
     
     @staticmethod
+    @functools.lru_cache(maxsize=1)
     def get_stix_schema_hints() -> str:
         """Get STIX 2.1 schema hints for the AI."""
         return """
@@ -0,0 +1,37 @@
+"""Token counting used to size document chunks."""
+import functools
+import logging
+from typing import Callable
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("stixagent")
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """Return a function that counts the tokens of a text for model.
+
+    Uses the model's tiktoken encoding, or cl100k_base for models tiktoken does
+    not know (e.g. Qwen). Falls back to character length when tiktoken or its
+    encoding files are unavailable. The encoder is shared and thread-safe.
+    """
+    if tiktoken is None:
+        logger.warning("tiktoken not installed, counting characters instead of tokens")
+        return len
+    try:
+        try:
+            encoder = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoder = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding, counting characters instead of tokens: {e}")
+        return len
+
+    def count_tokens(text: str) -> int:
+        return len(encoder.encode(text, disallowed_special=()))
+
+    return count_tokens
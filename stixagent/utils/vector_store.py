@@ -1,5 +1,7 @@
 """Vector store using LanceDB for STIX reference documents."""
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import lancedb
 try:
     from langchain_community.vectorstores import LanceDB
@@ -9,12 +11,14 @@ except ImportError:
     except ImportError:
         LanceDB = None
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 from ..loaders.document_loaders import DocumentLoader
+from ..cache import SemanticCache
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from config import VECTOR_DB_PATH, STIX_REFERENCE_PDF, API_KEY, EMBEDDING_MODEL, BASE_URL
+from config import VECTOR_DB_PATH, STIX_REFERENCE_PDF, API_KEY, EMBEDDING_MODEL, BASE_URL, CACHE_DIR, EMBEDDING_MAX_WORKERS
+from config import SEARCH_CACHE_THRESHOLD, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
 
 # Import embedding classes
 try:
@@ -43,31 +47,100 @@ class STIXVectorStore:
             length_function=len,
         )
         self.vector_store: Optional[LanceDB] = None
+        # Formatted context per (k, max_length), keyed by query similarity
+        self._context_caches: Dict[Tuple[int, Optional[int]], SemanticCache] = {}
+        self._init_lock = threading.Lock()
+        self._init_future: Optional[Future] = None
+        # Lazy setup runs from the init executor, prefetch and to_thread workers at once
+        self._embeddings_lock = threading.Lock()
+        self._store_lock = threading.Lock()
     
     def _ensure_embeddings(self):
         """Ensure embeddings are initialized (lazy initialization)."""
-        if self.embeddings is None:
-            if not OPENAILIKE_EMBEDDINGS_AVAILABLE:
-                raise ImportError(
-                    "OPENAILIKEEmbeddings not available. Install required dependencies."
-                )
-            if not self.api_key:
-                raise ValueError(
-                    "API_KEY is required but not set. Please set API_KEY environment variable."
-                )
-            if not self.embedding_base_url:
-                raise ValueError(
-                    "BASE_URL is required but not set. Please set BASE_URL environment variable."
-                )
+        if self.embeddings is not None:
+            return
+        with self._embeddings_lock:
+            if self.embeddings is None:
+                if not OPENAILIKE_EMBEDDINGS_AVAILABLE:
+                    raise ImportError(
+                        "OPENAILIKEEmbeddings not available. Install required dependencies."
+                    )
+                if not self.api_key:
+                    raise ValueError(
+                        "API_KEY is required but not set. Please set API_KEY environment variable."
+                    )
+                if not self.embedding_base_url:
+                    raise ValueError(
+                        "BASE_URL is required but not set. Please set BASE_URL environment variable."
+                    )
+                try:
+                    self.embeddings = OPENAILIKEEmbeddings(
+                        model=self.embedding_model,
+                        api_key=self.api_key,
+                        base_url=self.embedding_base_url,
+                        max_workers=EMBEDDING_MAX_WORKERS,
+                        cache_path=os.path.join(CACHE_DIR, "embeddings.sqlite")
+                    )
+                    print("[INFO] Using OPENAILIKEEmbeddings (OpenAI compatible API)")
+                except Exception as e:
+                    raise ValueError(f"Failed to initialize OPENAILIKEEmbeddings: {e}")
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single text with the reference store's embedding model."""
+        self._ensure_embeddings()
+        return self.embeddings.embed_query(text)
+    
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts at once (batched, parallel requests; cached on disk)."""
+        self._ensure_embeddings()
+        return self.embeddings.embed_documents(texts)
+    
+    def _get_context_cache(self, k: int, max_length: Optional[int]) -> SemanticCache:
+        """Get the query cache for one (k, max_length) combination."""
+        cache = self._context_caches.get((k, max_length))
+        if cache is None:
+            cache = self._context_caches.setdefault((k, max_length), SemanticCache(
+                embedder=self,
+                threshold=SEARCH_CACHE_THRESHOLD,
+                max_entries=SEARCH_CACHE_SIZE,
+                ttl=SEARCH_CACHE_TTL
+            ))
+        return cache
+    
+    def start_background_initialize(self) -> Future:
+        """Run initialize() on a background thread and return its future.
+        
+        Only one run is in flight at a time; a failed run is retried on the next
+        call. Callers overlap the load with other work (e.g. the first LLM call)
+        and search() waits for it only when it needs the index.
+        """
+        with self._init_lock:
+            future = self._init_future
+            if future is None or (future.done() and future.exception() is not None):
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-store-init")
+                future = self._init_future = executor.submit(self.initialize)
+                executor.shutdown(wait=False)
+            return future
+    
+    def start_prefetch(self, queries: Sequence[str], k: int = 5, max_length: Optional[int] = None) -> Future:
+        """Fill the context cache for likely queries in the background.
+        
+        Runs once the background initialize() has finished; a later
+        get_relevant_context() with the same k/max_length and the same or a
+        close query is then a cache hit.
+        """
+        def prefetch():
             try:
-                self.embeddings = OPENAILIKEEmbeddings(
-                    model=self.embedding_model,
-                    api_key=self.api_key,
-                    base_url=self.embedding_base_url
-                )
-                print("[INFO] Using OPENAILIKEEmbeddings (OpenAI compatible API)")
-            except Exception as e:
-                raise ValueError(f"Failed to initialize OPENAILIKEEmbeddings: {e}")
+                self.start_background_initialize().result()
+            except Exception:
+                return  # search() falls back to loading the store itself
+            with ThreadPoolExecutor(max_workers=min(len(queries), EMBEDDING_MAX_WORKERS) or 1) as pool:
+                list(pool.map(lambda q: self.get_relevant_context(q, k=k, max_length=max_length), queries))
+        
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-store-prefetch")
+        future = executor.submit(prefetch)
+        executor.shutdown(wait=False)
+        return future
     
     def is_initialized(self) -> bool:
         """Check if the vector store is already initialized."""
@@ -120,6 +193,9 @@ class STIXVectorStore:
         
         # Build new vector store
         print(f"Building vector store from {STIX_REFERENCE_PDF}...")
+        # Cached contexts were retrieved from the old table
+        for cache in self._context_caches.values():
+            cache.clear()
         
         # Load STIX reference PDF
         if not os.path.exists(STIX_REFERENCE_PDF):
@@ -161,52 +237,71 @@ class STIXVectorStore:
             else:
                 raise
     
-    def search(self, query: str, k: int = 5) -> List[dict]:
-        """Search for relevant STIX documentation."""
+    def search(self, query: str, k: int = 5, embedding: Optional[List[float]] = None) -> List[dict]:
+        """Search for relevant STIX documentation.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            embedding: Precomputed embedding of query; embedded here when None
+        """
+        # Wait for a background initialize() still in flight instead of starting a second one
+        future = self._init_future
+        if future is not None and not future.done():
+            try:
+                future.result()
+            except Exception as e:
+                import logging
+                logging.getLogger("stixagent").warning(f"Background vector store initialization failed: {e}")
+        
         # Ensure embeddings are initialized
         self._ensure_embeddings()
         
-        if self.vector_store is None:
-            # Check if vector store exists but not loaded
-            if not self.is_initialized():
-                import logging
-                logger = logging.getLogger("stixagent")
-                logger.warning("Vector store not initialized. Attempting to load existing vector store...")
-                try:
-                    self.initialize()
-                    # Re-check if initialized successfully
-                    if self.vector_store is None:
-                        logger.warning("Vector store initialization returned None. Search will return empty results.")
+        # Concurrent first searches must not load (or build) the store twice
+        with self._store_lock:
+            if self.vector_store is None:
+                # Check if vector store exists but not loaded
+                if not self.is_initialized():
+                    import logging
+                    logger = logging.getLogger("stixagent")
+                    logger.warning("Vector store not initialized. Attempting to load existing vector store...")
+                    try:
+                        self.initialize()
+                        # Re-check if initialized successfully
+                        if self.vector_store is None:
+                            logger.warning("Vector store initialization returned None. Search will return empty results.")
+                            return []
+                    except Exception as e:
+                        logger.warning(f"Failed to initialize vector store: {e}")
                         return []
-                except Exception as e:
-                    logger.warning(f"Failed to initialize vector store: {e}")
-                    return []
-            else:
-                # Try to load existing vector store
-                try:
-                    db = lancedb.connect(self.db_path)
-                    if self._check_table_exists(db) and LanceDB is not None:
-                        self.vector_store = LanceDB(
-                            uri=self.db_path,
-                            table_name=self.table_name,
-                            embedding=self.embeddings
-                        )
-                    else:
+                else:
+                    # Try to load existing vector store
+                    try:
+                        db = lancedb.connect(self.db_path)
+                        if self._check_table_exists(db) and LanceDB is not None:
+                            self.vector_store = LanceDB(
+                                uri=self.db_path,
+                                table_name=self.table_name,
+                                embedding=self.embeddings
+                            )
+                        else:
+                            import logging
+                            logger = logging.getLogger("stixagent")
+                            if LanceDB is None:
+                                logger.warning("LanceDB not available. Search will return empty results.")
+                            else:
+                                logger.warning("Vector store table does not exist. Search will return empty results.")
+                            return []
+                    except Exception as e:
                         import logging
                         logger = logging.getLogger("stixagent")
-                        if LanceDB is None:
-                            logger.warning("LanceDB not available. Search will return empty results.")
-                        else:
-                            logger.warning("Vector store table does not exist. Search will return empty results.")
+                        logger.warning(f"Failed to load vector store: {e}")
                         return []
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger("stixagent")
-                    logger.warning(f"Failed to load vector store: {e}")
-                    return []
         
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
+            if embedding is None:
+                embedding = self.embeddings.embed_query(query)
+            results = self.vector_store.similarity_search_by_vector(embedding, k=k, score=True)
             
             return [
                 {
@@ -236,8 +331,22 @@ class STIXVectorStore:
             k: Number of results to return
             max_length: Maximum length of returned context (characters). If None, no limit.
         """
+        # Case and whitespace variants of a query share one cache entry; the original query is
+        # embedded once and that vector serves both the cache lookup and the index search
+        cache_key = " ".join(query.lower().split())
         try:
-            results = self.search(query, k=k)
+            cache = self._get_context_cache(k, max_length)
+            try:
+                embedding = self.embed_query(query)
+            except Exception as e:
+                import logging
+                logging.getLogger("stixagent").warning(f"Query embedding failed: {e}")
+                embedding = None
+            cached = cache.get(cache_key, vector=embedding)
+            if cached is not None:
+                return cached
+            
+            results = self.search(query, k=k, embedding=embedding)
             if not results:
                 return "无法从 STIX 参考文档中检索到相关信息（embedding API 调用失败）。请根据系统提示中的 STIX 格式要求生成输出。"
             
@@ -262,10 +371,26 @@ class STIXVectorStore:
                 )
                 current_length += len(context_parts[-1])
             
-            return "\n".join(context_parts)
+            context = "\n".join(context_parts)
+            cache.set(cache_key, context, vector=embedding)
+            return context
         except Exception as e:
             import logging
             logger = logging.getLogger("stixagent")
             logger.warning(f"Failed to get relevant context: {e}")
             return "无法从 STIX 参考文档中检索到相关信息。请根据系统提示中的 STIX 格式要求生成输出。"
 
+
+
+# Shared lazy singleton so both agents reuse one store and embedding client
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store() -> STIXVectorStore:
+    """Get or create the shared vector store instance (lazy initialization)."""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = STIXVectorStore()
+    return _vector_store
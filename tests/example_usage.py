@@ -1,6 +1,6 @@
 """Example usage of STIX Agent."""
 from document_loaders import DocumentLoader
-from agent import STIXAgent
+from agent import get_agent
 import json
 
 
@@ -17,8 +17,8 @@ def example_convert_text():
     Indicator: Malicious SQL query detected
     """
     
-    # Initialize agent
-    agent = STIXAgent()
+    # Get the shared agent (built once, reused across examples)
+    agent = get_agent()
     
     # Convert to STIX
     stix_output = agent.convert_to_stix(sample_text)
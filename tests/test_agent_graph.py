@@ -0,0 +1,81 @@
+"""Tests for the STIXAgent message window and iteration limit."""
+import asyncio
+import os
+import sys
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import tool
+
+from config import MAX_ITERATIONS
+from stixagent.agents.agent import STIXAgent, _trim_messages
+
+
+def _tool_round(n, calls=2):
+    """An AIMessage with `calls` tool calls followed by their ToolMessages."""
+    ids = [f"call_{n}_{i}" for i in range(calls)]
+    ai = AIMessage(content="", tool_calls=[{"name": "search_stix_reference", "args": {}, "id": i} for i in ids])
+    return [ai] + [ToolMessage(content="result", tool_call_id=i) for i in ids]
+
+
+def test_trim_never_orphans_tool_messages():
+    """Every kept ToolMessage is preceded by the AIMessage that requested it."""
+    messages = [SystemMessage(content="system"), HumanMessage(content="document")]
+    for n in range(5):
+        messages += _tool_round(n, calls=n % 3 + 1)
+    messages.append(AIMessage(content="{}"))
+
+    for max_history in range(len(messages)):
+        trimmed = _trim_messages(messages, max_history)
+        assert trimmed[:2] == messages[:2]
+        requested = set()
+        for message in trimmed[2:]:
+            if isinstance(message, AIMessage):
+                requested.update(call["id"] for call in message.tool_calls)
+            elif isinstance(message, ToolMessage):
+                assert message.tool_call_id in requested, (max_history, message.tool_call_id)
+        assert trimmed[-1] is messages[-1]
+
+
+@tool
+def noop() -> str:
+    """Do nothing."""
+    return "ok"
+
+
+class _AlwaysCallsTool:
+    """Chat model stand-in that requests a tool call on every turn."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        yield AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "noop", "args": "{}", "id": f"call_{self.calls}", "index": 0}
+        ])
+
+
+def test_recursion_limit_stops_after_max_iterations():
+    """A model that never stops calling tools gets exactly MAX_ITERATIONS agent steps."""
+    agent = STIXAgent.__new__(STIXAgent)  # Skip __init__: no cache or vector store needed
+    agent.tools = [noop]
+    llm = _AlwaysCallsTool()
+    agent.__dict__["llm_with_tools"] = llm
+    initial_state = {
+        "messages": [SystemMessage(content="system"), HumanMessage(content="document")],
+        "input_document": "document",
+        "stix_output": "",
+        "iteration_count": 0,
+    }
+
+    final_state = asyncio.run(agent._arun_graph(initial_state))
+
+    assert llm.calls == MAX_ITERATIONS
+    assert final_state["iteration_count"] == MAX_ITERATIONS
+    # The run stops right after the last agent step, before its tool calls execute
+    assert isinstance(final_state["messages"][-1], AIMessage)
@@ -0,0 +1,56 @@
+"""Tests for the brace-matching JSON extraction helpers."""
+import os
+import sys
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from stixagent.utils.json_utils import JSONStreamScanner, iter_json_objects, extract_json
+
+
+def test_braces_inside_strings_are_ignored():
+    """Braces in string values neither open nor close an object."""
+    text = 'Result: {"pattern": "[file:name = \'a}b{c\']", "note": "}}"} done'
+    assert list(iter_json_objects(text)) == ['{"pattern": "[file:name = \'a}b{c\']", "note": "}}"}']
+    assert extract_json(text) == {"pattern": "[file:name = 'a}b{c']", "note": "}}"}
+
+
+def test_escaped_quotes_do_not_end_strings():
+    """An escaped quote stays inside the string, an escaped backslash does not."""
+    text = r'{"a": "say \"}\" now", "b": "C:\\"} tail {"c": 1}'
+    assert list(iter_json_objects(text)) == [r'{"a": "say \"}\" now", "b": "C:\\"}', '{"c": 1}']
+    assert extract_json(text) == {"a": 'say "}" now', "b": "C:\\"}
+
+
+def test_multiple_objects_and_nesting():
+    """Top-level objects are yielded in order; nested ones are part of their parent."""
+    text = 'x {"a": {"b": {}}} y {"c": [1, {"d": 2}]} z'
+    assert list(iter_json_objects(text)) == ['{"a": {"b": {}}}', '{"c": [1, {"d": 2}]}']
+
+
+def test_extract_json_skips_candidates_that_do_not_parse():
+    """A balanced span that is not JSON is skipped in favour of the next one."""
+    text = 'Use {placeholder} then ```json\n{"type": "bundle", "objects": []}\n```'
+    assert extract_json(text) == {"type": "bundle", "objects": []}
+    assert extract_json("no json here") is None
+
+
+def test_truncated_input_yields_nothing():
+    """An object cut off mid-stream is not returned."""
+    text = '{"type": "bundle", "objects": [{"id": "indicator--1"'
+    assert list(iter_json_objects(text)) == []
+    assert extract_json(text) is None
+
+
+def test_stream_scanner_handles_split_pieces():
+    """Objects split at any position, including inside an escape, are found once complete."""
+    text = r'prefix {"a": "q\"}", "b": {"c": "{"}} middle {"d": 1}'
+    expected = [r'{"a": "q\"}", "b": {"c": "{"}}', '{"d": 1}']
+    for size in range(1, len(text) + 1):
+        scanner = JSONStreamScanner()
+        found = []
+        for start in range(0, len(text), size):
+            found.extend(scanner.feed(text[start:start + size]))
+        assert found == expected, size
@@ -0,0 +1,99 @@
+"""Tests for merging chunk results in ReActSTIXAgent."""
+import copy
+import os
+import sys
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from stixagent.agents.react_agent import ReActSTIXAgent
+
+
+def _indicator(obj_id, pattern="[ipv4-addr:value = '10.0.0.1']"):
+    return {"type": "indicator", "id": obj_id, "name": "C2 address", "pattern": pattern}
+
+
+def _malware(obj_id, name="Emotet"):
+    return {"type": "malware", "id": obj_id, "name": name}
+
+
+def _relationship(obj_id, source_ref, target_ref, relationship_type="indicates"):
+    return {
+        "type": "relationship",
+        "id": obj_id,
+        "relationship_type": relationship_type,
+        "source_ref": source_ref,
+        "target_ref": target_ref,
+    }
+
+
+def test_dedup_rewrites_refs_to_kept_object():
+    """References to a dropped content duplicate point at the object that was kept."""
+    chunks = [
+        {"objects": [_indicator("indicator--a"), _malware("malware--a")]},
+        {"objects": [
+            _indicator("indicator--b"),
+            _relationship("relationship--b", "indicator--b", "malware--a"),
+            {"type": "report", "id": "report--b", "name": "Report", "object_refs": ["indicator--b", "malware--a"]},
+        ]},
+    ]
+    original = copy.deepcopy(chunks)
+
+    objects = {obj["id"]: obj for obj in ReActSTIXAgent._dedup_objects(chunks)}
+
+    assert "indicator--b" not in objects
+    assert objects["relationship--b"]["source_ref"] == "indicator--a"
+    assert objects["report--b"]["object_refs"] == ["indicator--a", "malware--a"]
+    # Chunk results are also saved as intermediate output and must not be mutated
+    assert chunks == original
+
+
+def test_dedup_collapses_relationships_between_merged_objects():
+    """An edge that only differs by the ids of merged duplicates is kept once."""
+    chunks = [
+        {"objects": [
+            _indicator("indicator--a"),
+            _malware("malware--a"),
+            _relationship("relationship--a", "indicator--a", "malware--a"),
+        ]},
+        {"objects": [
+            _indicator("indicator--b"),
+            _malware("malware--b"),
+            _relationship("relationship--b", "indicator--b", "malware--b"),
+            _relationship("relationship--c", "indicator--b", "malware--b", relationship_type="related-to"),
+        ]},
+    ]
+
+    objects = ReActSTIXAgent._dedup_objects(chunks)
+    relationships = [obj for obj in objects if obj["type"] == "relationship"]
+
+    assert [obj["id"] for obj in relationships] == ["relationship--a", "relationship--c"]
+    assert relationships[1]["source_ref"] == "indicator--a"
+    assert relationships[1]["target_ref"] == "malware--a"
+
+
+def test_dedup_keeps_same_name_with_different_type():
+    """Objects sharing a name but not a type describe different things."""
+    chunks = [
+        {"objects": [_malware("malware--a", name="Cobalt Strike")]},
+        {"objects": [{"type": "tool", "id": "tool--a", "name": "Cobalt Strike"}]},
+    ]
+
+    objects = ReActSTIXAgent._dedup_objects(chunks)
+
+    assert [obj["id"] for obj in objects] == ["malware--a", "tool--a"]
+
+
+def test_dedup_drops_repeated_ids_first_wins():
+    """A repeated id keeps the first object; objects without an id are dropped."""
+    chunks = [
+        {"objects": [_malware("malware--a", name="First")]},
+        {"objects": [_malware("malware--a", name="Second"), {"type": "malware", "name": "No id"}]},
+        None,
+    ]
+
+    objects = ReActSTIXAgent._dedup_objects(chunks)
+
+    assert objects == [_malware("malware--a", name="First")]
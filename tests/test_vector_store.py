@@ -0,0 +1,63 @@
+"""Tests for the STIX reference context lookup."""
+import os
+import sys
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from langchain_core.documents import Document
+
+from stixagent.utils.vector_store import STIXVectorStore
+
+
+class _CountingEmbeddings:
+    """Embedding client stand-in that counts embed_query calls."""
+
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [1.0, float(len(text) % 7), 0.5]
+
+
+class _FakeLanceDB:
+    """Vector store stand-in that only supports search by vector."""
+
+    def __init__(self):
+        self.searches = []
+
+    def similarity_search_by_vector(self, embedding, k=None, score=False):
+        self.searches.append(embedding)
+        return [(Document(page_content="Indicator pattern syntax", metadata={"source": "stix.pdf", "page": 1}), 0.1)]
+
+
+def _store():
+    store = STIXVectorStore()
+    store.embeddings = _CountingEmbeddings()
+    store.vector_store = _FakeLanceDB()
+    return store
+
+
+def test_context_lookup_embeds_query_once():
+    """A cache miss embeds the query once and searches with that same vector."""
+    store = _store()
+
+    context = store.get_relevant_context("Indicator Pattern", k=3)
+
+    assert "Indicator pattern syntax" in context
+    assert store.embeddings.queries == ["Indicator Pattern"]
+    assert store.vector_store.searches == [[1.0, float(len("Indicator Pattern") % 7), 0.5]]
+
+
+def test_context_variants_share_cache_entry():
+    """A case or spacing variant is a cache hit and costs one embedding, no search."""
+    store = _store()
+    store.get_relevant_context("Indicator Pattern", k=3)
+
+    store.get_relevant_context("  indicator   pattern ", k=3)
+
+    assert len(store.embeddings.queries) == 2
+    assert len(store.vector_store.searches) == 1
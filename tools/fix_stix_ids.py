@@ -13,6 +13,12 @@ from typing import Dict, Any, Set
 class STIXIDFixer:
     """修复STIX 2.1对象ID的工具类"""
 
+    # UUID只能包含十六进制字符(0-9, a-f)和连字符；类级别编译一次，所有实例共享
+    UUID_PATTERN = re.compile(
+        r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}',
+        re.IGNORECASE
+    )
+
     def __init__(self):
         self.id_mapping: Dict[str, str] = {}  # 旧ID -> 新ID的映射
         self.processed_objects: Set[str] = set()  # 已处理的对象ID
@@ -57,12 +63,7 @@ class STIXIDFixer:
             是否为有效的UUID格式
         """
         try:
-            # UUID只能包含十六进制字符(0-9, a-f)和连字符
-            uuid_pattern = re.compile(
-                r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-                re.IGNORECASE
-            )
-            return bool(uuid_pattern.match(uuid_str))
+            return self.UUID_PATTERN.fullmatch(uuid_str) is not None
         except Exception:
             return False
 
@@ -12,6 +12,12 @@ from typing import Dict, List, Any
 class STIXIDValidator:
     """STIX ID验证器"""
 
+    # UUID只能包含十六进制字符(0-9, a-f)和连字符；类级别编译一次，所有实例共享
+    UUID_PATTERN = re.compile(
+        r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}',
+        re.IGNORECASE
+    )
+
     def __init__(self):
         self.errors: List[str] = []
         self.warnings: List[str] = []
@@ -21,11 +27,7 @@ class STIXIDValidator:
 
     def is_valid_uuid(self, uuid_str: str) -> bool:
         """检查UUID字符串是否有效"""
-        uuid_pattern = re.compile(
-            r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-            re.IGNORECASE
-        )
-        return bool(uuid_pattern.match(uuid_str))
+        return self.UUID_PATTERN.fullmatch(uuid_str) is not None
 
     def is_valid_stix_id(self, stix_id: str, object_type: str = None) -> bool:
         """检查STIX ID是否符合规范"""